@@ -7,8 +7,12 @@ import asyncio
 import logging
 
 import json
+from functools import lru_cache
 from getpass import getpass
 
+import json_backend
+from snapshot_store import SnapshotStore, flatten_coins, flatten_participants_with_coalitions, flatten_peers
+
 logging.basicConfig(
 	level=logging.INFO,
 	format='%(asctime)s - %(levelname)s - %(message)s',
@@ -20,6 +24,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
+SCHEMA_PATH = 's21schema/schema/schema.gql'
+
+# Поля оценок проекта, которые реально используются (без аватаров, видео, категорий отзывов и ролей)
+PROJECT_EVALUATION_FIELDS = [
+	'studentAnswerId',
+	'attemptResult.finalPointProject',
+	'attemptResult.finalPercentageProject',
+	'attemptResult.resultModuleCompletion',
+	'attemptResult.resultDate',
+	'team.team.id',
+	'team.team.name',
+	'team.members.role',
+	'team.members.user.id',
+	'team.members.user.login',
+	'p2p.status',
+	'p2p.checklist.id',
+	'p2p.checklist.checklistId',
+	'p2p.checklist.startTimeCheck',
+	'p2p.checklist.endTimeCheck',
+	'p2p.checklist.reviewer.login',
+	'p2p.checklist.reviewFeedback.comment',
+	'p2p.checklist.comment',
+	'p2p.checklist.receivedPoint',
+	'p2p.checklist.receivedPercentage',
+	'p2p.checklist.quickAction',
+	'p2p.checklist.checkType',
+	'p2p.checklist.onlineReview.isOnline',
+	'auto.status',
+	'auto.receivedPercentage',
+	'auto.endTimeCheck',
+	'codeReview.averageMark',
+	'codeReview.studentCodeReviews.user.login',
+	'codeReview.studentCodeReviews.finalMark',
+	'codeReview.studentCodeReviews.markTime',
+	'codeReview.studentCodeReviews.reviewerCommentsCount',
+]
+
+
+@lru_cache(maxsize=None)
+def project_evaluations_query():
+	"""Запрос оценок проекта: схема разбирается один раз, graphql-core импортируется только здесь."""
+	from query_builder import QueryBuilder
+
+	return QueryBuilder.from_file(SCHEMA_PATH).build(
+		'getProjectAttemptEvaluationsInfoByStudent',
+		root='school21.getProjectAttemptEvaluationsInfo',
+		fields=PROJECT_EVALUATION_FIELDS,
+	)
+
+
 class Api:
 
 	def __init__(self):
@@ -30,6 +84,8 @@ class Api:
 			'Content-Type': 'application/json',
 			'x-edu-org-unit-id': '6bfe3c56-0211-4fe1-9e59-51616caac4dd',
 		}
+		# Колоночные снимки рядом с JSON-дампами, если установлен pyarrow
+		self.snapshots = SnapshotStore() if SnapshotStore.available() else None
 
 	def get_token(self):
 		try:
@@ -87,8 +143,7 @@ class Api:
 
 	def check_existing_file(self, file, func, params=None):
 		try:
-			with open(file, 'r') as f:
-				data = json.load(f)
+			data = json_backend.load(file)
 		except:
 			data = func(params)
 		return data
@@ -96,8 +151,7 @@ class Api:
 	async def get_campuses(self):
 		tasks = [self.request('GET', self.base_url + '/v1/campuses', headers=self.headers)]
 		response = await asyncio.gather(*tasks)
-		with open('campuses.json', 'w') as f:
-			json.dump(response[0]['json'], f, ensure_ascii=False, indent=4)
+		json_backend.dump(response[0]['json'], 'campuses.json')
 		return response[0]['json'] 
 
 	async def get_coalitions(self):
@@ -110,14 +164,12 @@ class Api:
 
 		# coalitions = [response['json'] for response in response]
 
-		with open('coalitions.json', 'w') as f:
-			json.dump(coalitions, f, ensure_ascii=False, indent=4)
+		json_backend.dump(coalitions, 'coalitions.json')
 		return coalitions
 
 	def get_all_participants(self):
 		try:
-			with open('campuses.json', 'r') as f:
-				campuses = json.load(f)
+			campuses = json_backend.load('campuses.json')
 		except:
 			campuses = self.get_campuses()
 
@@ -138,13 +190,11 @@ class Api:
 				
 			campus_participants[campus['shortName']] = participants
 
-		with open('all_participants.json', 'w') as f:
-			json.dump(campus_participants, f, ensure_ascii=False, indent=4)
+		json_backend.dump(campus_participants, 'all_participants.json')
 
 	def get_all_participants_with_coalitions(self):
 		try:
-			with open('coalitions.json', 'r') as f:
-				coalitions = json.load(f)
+			coalitions = json_backend.load('coalitions.json')
 		except:
 			coalitions = self.get_coalitions()
 
@@ -165,8 +215,9 @@ class Api:
 						campus_participants[campus][coalition['name']].extend(data)
 						offset += 1000
 
-		with open('all_participants_with_coalitions.json', 'w') as f:
-			json.dump(campus_participants, f, ensure_ascii=False, indent=4)
+		json_backend.dump(campus_participants, 'all_participants_with_coalitions.json')
+		if self.snapshots:
+			self.snapshots.write_by_campus('participants_with_coalitions', flatten_participants_with_coalitions(campus_participants))
 
 	def update_participants(self):
 		def get_credentials_by_login(login):
@@ -194,8 +245,7 @@ class Api:
 					status_code = None
 			return result
 		try:
-			with open('all_participants_with_coalitions.json', 'r') as f:
-				peers = json.load(f)
+			peers = json_backend.load('all_participants_with_coalitions.json')
 		except:
 			peers = self.get_all_participants_with_coalitions() 
 
@@ -210,189 +260,20 @@ class Api:
 				logins[coalition][peer] = get_credentials_by_login(peer)
 		
 		peers['21 Moscow'] = logins
-		with open('peers.json', 'w') as f:
-			json.dump(peers, f, ensure_ascii=False, indent=4)
+		json_backend.dump(peers, 'peers.json')
+		if self.snapshots:
+			self.snapshots.write_by_campus('peers', flatten_peers(peers))
 
 	def get_project_info(self, login):
 
-		with open(f'projects_{login}.json', 'r') as f:
-			data = json.load(f)
-			projectsID = [project['id'] for project in data['projects'] if (
-				(project['status'] == 'ACCEPTED' or
-				project['status'] == 'FAILED') and
-				not 'EXAM' in project['type']
-				)]
-
-			query = '''
-
-			query getProjectAttemptEvaluationsInfoByStudent($goalId: ID!, $studentId: UUID!) {
-				school21 {
-					getProjectAttemptEvaluationsInfo(goalId: $goalId, studentId: $studentId) {
-						...ProjectAttemptEvaluations
-						__typename
-					}
-					__typename
-				}
-			}
-
-			fragment ProjectAttemptEvaluations on ProjectAttemptEvaluationsInfo {
-				studentAnswerId
-				attemptResult {
-					...AtemptResult
-					__typename
-				}
-				team {
-					...AttemptTeamWithMembers
-					__typename
-				}
-				p2p {
-					...P2PEvaluation
-					__typename
-				}
-				auto {
-					status
-					receivedPercentage
-					endTimeCheck
-					resultInfo
-					__typename
-				}
-				codeReview {
-					averageMark
-					studentCodeReviews {
-						user {
-							avatarUrl
-							login
-							__typename
-						}
-						finalMark
-						markTime
-						reviewerCommentsCount
-						__typename
-					}
-					__typename
-				}
-				__typename
-			}
-
-			fragment AtemptResult on StudentGoalAttempt {
-				finalPointProject
-				finalPercentageProject
-				resultModuleCompletion
-				resultDate
-				__typename
-			}
-
-			fragment AttemptTeamWithMembers on TeamWithMembers {
-				team {
-					id
-					name
-					__typename
-				}
-				members {
-					role
-					user {
-						...AttemptTeamMember
-						__typename
-					}
-					__typename
-				}
-				__typename
-			}
-
-			fragment AttemptTeamMember on User {
-				id
-				avatarUrl
-				login
-				userExperience {
-					level {
-						id
-						range {
-							levelCode
-							__typename
-						}
-						__typename
-					}
-					cookiesCount
-					codeReviewPoints
-					__typename
-				}
-				__typename
-			}
-
-			fragment P2PEvaluation on P2PEvaluationInfo {
-				status
-				checklist {
-					...Checklist
-					__typename
-				}
-				__typename
-			}
-
-			fragment Checklist on FilledChecklist {
-				id
-				checklistId
-				endTimeCheck
-				startTimeCheck
-				reviewer {
-					avatarUrl
-					login
-					businessAdminRoles {
-						id
-						school {
-							id
-							organizationType
-							__typename
-						}
-						__typename
-					}
-					__typename
-				}
-				reviewFeedback {
-					...EvaluationFeedback
-					__typename
-				}
-				comment
-				receivedPoint
-				receivedPercentage
-				quickAction
-				checkType
-				onlineReview {
-					...OnlineReviewInfo
-					__typename
-				}
-				__typename
-			}
-
-			fragment EvaluationFeedback on ReviewFeedback {
-				id
-				comment
-				filledChecklist {
-					id
-					__typename
-				}
-				reviewFeedbackCategoryValues {
-					feedbackCategory
-					feedbackValue
-					id
-					__typename
-				}
-				__typename
-			}
+		data = json_backend.load(f'projects_{login}.json')
+		projectsID = [project['id'] for project in data['projects'] if (
+			(project['status'] == 'ACCEPTED' or
+			project['status'] == 'FAILED') and
+			not 'EXAM' in project['type']
+			)]
 
-			fragment OnlineReviewInfo on OnlineReview {
-				isOnline
-				videos {
-					onlineVideoId
-					link
-					status
-					statusDetails
-					updateDateTime
-					fileSize
-					__typename
-				}
-				__typename
-			}
-			'''
+		query = project_evaluations_query()
 
 		projects = {}
 
@@ -409,25 +290,19 @@ class Api:
 
 			response = httpx.post('https://edu.21-school.ru/services/graphql', json=json_data, headers=self.headers)
 			print(response.status_code)
-			data = json.loads(response.text)['data']['school21']['getProjectAttemptEvaluationsInfo']
-			for eval in data:
-				eval['auto']['resultInfo'] = None 
-
+			data = json_backend.loads(response.content)['data']['school21']['getProjectAttemptEvaluationsInfo']
 			projects[project_id] = data
 		
-		with open(f'participant_{json_data["variables"]["studentId"]}.json', 'w', encoding='utf-8') as f:
-			json.dump(projects,f, ensure_ascii=False, indent=4)
+		json_backend.dump(projects, f'participant_{json_data["variables"]["studentId"]}.json')
 
 	def get_projects(self, login):
 		response = httpx.get(url=f'{self.base_url}/v1/participants/{login}/projects', headers=self.headers, params={'limit': 1000, 'offset': 0})
-		with open(f'projects_{login}.json', 'w', encoding='utf-8') as f:
-			json.dump(response.json(), f, ensure_ascii=False, indent=4)
+		json_backend.dump(response.json(), f'projects_{login}.json')
 		return response.json()
 
 	def get_coins(self):
 		try:
-			with open('all_participants_with_coalitions.json', 'r') as f:
-				peers = json.load(f)
+			peers = json_backend.load('all_participants_with_coalitions.json')
 		except:
 			peers = self.get_all_participants_with_coalitions() 
 
@@ -453,8 +328,9 @@ class Api:
 
 			coins = dict(sorted(coins.items(), key=lambda x: x[1], reverse=True))
 
-			with open(f'coins_{coalition.lower()}.json', 'w') as f:
-				json.dump(coins, f, ensure_ascii=False, indent=4)
+			json_backend.dump(coins, f'coins_{coalition.lower()}.json')
+			if self.snapshots:
+				self.snapshots.write_by_campus('coins', flatten_coins(coins, '21 Moscow', coalition))
 
 		return coins
 
@@ -0,0 +1,183 @@
+import asyncio
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Optional, Dict, Any, Callable, List
+
+import json_backend
+
+# Логины, id проектов, кампусов и т.п. заменяются шаблоном, чтобы число серий не росло
+ENDPOINT_IDS = re.compile(r"(v1/(?:participants|projects|campuses|coalitions|clusters|courses))/[^/]+")
+
+
+def endpoint_label(endpoint: str, operation_name: Optional[str] = None) -> str:
+    """Нормализованное имя эндпоинта для меток метрик."""
+    if operation_name:
+        return f"graphql:{operation_name}"
+    return ENDPOINT_IDS.sub(r"\1/{id}", endpoint)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмическими корзинами (в духе HDR Histogram):
+    относительная ошибка процентилей не превышает ~4.5% во всём диапазоне
+    от min_value до max_value секунд при фиксированной памяти.
+    """
+
+    def __init__(self, min_value: float = 0.001, max_value: float = 300.0, precision: int = 16):
+        self.min_value = min_value
+        self.growth = 2 ** (1 / precision)
+        self.buckets = [0] * (int(math.log(max_value / min_value, self.growth)) + 2)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return min(len(self.buckets) - 1, int(math.log(value / self.min_value, self.growth)) + 1)
+
+    def _upper_bound(self, index: int) -> float:
+        return self.min_value * self.growth ** index
+
+    def record(self, value: float):
+        self.buckets[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for index, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "p50": round(self.percentile(50), 6),
+            "p90": round(self.percentile(90), 6),
+            "p99": round(self.percentile(99), 6),
+            "max": round(self.max, 6),
+        }
+
+    def cumulative(self, bounds: List[float]) -> List[int]:
+        """Накопленные количества для заданных границ (формат Prometheus)."""
+        result = []
+        for bound in bounds:
+            index = self._index(bound)
+            result.append(sum(self.buckets[: index + 1]))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Счётчики и гистограммы задержек по эндпоинтам.
+
+    Экспорт — через snapshot() / dump_json() или в текстовом формате
+    Prometheus через render_prometheus() и serve() (/metrics).
+    """
+
+    PROMETHEUS_BOUNDS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+    def __init__(self):
+        self.requests: Dict[tuple, int] = defaultdict(int)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.throttled: Dict[str, int] = defaultdict(int)
+        self.bytes_received: Dict[str, int] = defaultdict(int)
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.gauges: Dict[str, Callable[[], Any]] = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, status: Optional[int], latency: float, size: int = 0):
+        """Записывает результат одной попытки запроса."""
+        with self._lock:
+            self.requests[(endpoint, str(status or "error"))] += 1
+            self.latency[endpoint].record(latency)
+            self.bytes_received[endpoint] += size
+            if status == 429:
+                self.throttled[endpoint] += 1
+
+    def retry(self, endpoint: str):
+        with self._lock:
+            self.retries[endpoint] += 1
+
+    def register_gauge(self, name: str, callback: Callable[[], Any]):
+        """Значение, вычисляемое в момент экспорта (например, состояние лимитера)."""
+        self.gauges[name] = callback
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for (endpoint, status), count in self.requests.items():
+                entry = endpoints.setdefault(endpoint, {"requests": {}})
+                entry["requests"][status] = count
+            for endpoint, entry in endpoints.items():
+                entry["retries"] = self.retries.get(endpoint, 0)
+                entry["throttled"] = self.throttled.get(endpoint, 0)
+                entry["bytes_received"] = self.bytes_received.get(endpoint, 0)
+                entry["latency"] = self.latency[endpoint].summary()
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "endpoints": endpoints,
+            **{name: callback() for name, callback in self.gauges.items()},
+        }
+
+    def dump_json(self, path: str = "metrics.json"):
+        json_backend.dump(self.snapshot(), path)
+
+    async def dump_periodically(self, path: str = "metrics.json", interval: float = 30.0):
+        """Периодически сохраняет snapshot() в файл; запускать как фоновую задачу."""
+        while True:
+            await asyncio.sleep(interval)
+            self.dump_json(path)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE s21_requests_total counter",
+            *(
+                f's21_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                for (endpoint, status), count in sorted(self.requests.items())
+            ),
+            "# TYPE s21_retries_total counter",
+            *(f's21_retries_total{{endpoint="{e}"}} {c}' for e, c in sorted(self.retries.items())),
+            "# TYPE s21_throttled_total counter",
+            *(f's21_throttled_total{{endpoint="{e}"}} {c}' for e, c in sorted(self.throttled.items())),
+            "# TYPE s21_bytes_received_total counter",
+            *(f's21_bytes_received_total{{endpoint="{e}"}} {c}' for e, c in sorted(self.bytes_received.items())),
+            "# TYPE s21_request_latency_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.latency.items()):
+            for bound, count in zip(self.PROMETHEUS_BOUNDS, histogram.cumulative(self.PROMETHEUS_BOUNDS)):
+                lines.append(f's21_request_latency_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f's21_request_latency_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.count}')
+            lines.append(f's21_request_latency_seconds_sum{{endpoint="{endpoint}"}} {histogram.total}')
+            lines.append(f's21_request_latency_seconds_count{{endpoint="{endpoint}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9121):
+        """Поднимает локальный HTTP-сервер с эндпоинтами /metrics и /metrics.json."""
+        from aiohttp import web
+
+        async def prometheus(request):
+            return web.Response(text=self.render_prometheus(), content_type="text/plain")
+
+        async def as_json(request):
+            return web.json_response(self.snapshot())
+
+        app = web.Application()
+        app.router.add_get("/metrics", prometheus)
+        app.router.add_get("/metrics.json", as_json)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
@@ -0,0 +1,245 @@
+"""
+Типизированные модели ответов School21API.
+
+Если установлен msgspec, модели — msgspec.Struct: ответ декодируется прямо
+из байтов в объекты с проверкой типов за один проход. Иначе используются
+классы с __slots__, которые собираются из уже разобранного JSON.
+В обоих случаях объекты занимают в разы меньше памяти, чем вложенные dict,
+и дают доступ к полям через атрибуты вместо цепочек .get().
+
+participant = api_models.decode(raw_bytes, api_models.Participant)
+participant.campus.shortName
+"""
+
+import typing
+import uuid
+from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+
+import json_backend
+
+try:
+    import msgspec
+except ImportError:  # msgspec необязателен
+    msgspec = None
+
+T = TypeVar("T")
+
+if msgspec is not None:
+    ValidationError = msgspec.ValidationError
+else:
+    class ValidationError(ValueError):
+        """Ответ не соответствует модели."""
+
+
+if msgspec is not None:
+    class Record(msgspec.Struct, kw_only=True, omit_defaults=True):
+        """Базовая модель: неизвестные поля ответа игнорируются, отсутствующие равны None."""
+
+else:
+    class _SlotsMeta(type):
+        def __new__(mcls, name, bases, namespace, **kwargs):
+            annotations = namespace.get("__annotations__", {})
+            defaults = {field: namespace.pop(field) for field in annotations if field in namespace}
+            namespace["__slots__"] = tuple(annotations)
+            cls = super().__new__(mcls, name, bases, namespace)
+            cls.__defaults__ = {**getattr(cls, "__defaults__", {}), **defaults}
+            cls.__struct_fields__ = tuple(
+                field for base in reversed(cls.__mro__) for field in base.__dict__.get("__slots__", ())
+            )
+            return cls
+
+    class Record(metaclass=_SlotsMeta):
+        """Базовая модель: неизвестные поля ответа игнорируются, отсутствующие равны None."""
+
+        def __init__(self, **fields):
+            for field in self.__struct_fields__:
+                if field in fields:
+                    value = fields[field]
+                else:
+                    value = self.__defaults__.get(field)
+                    # Изменяемые значения по умолчанию не должны быть общими для экземпляров
+                    value = list(value) if isinstance(value, list) else value
+                setattr(self, field, value)
+
+        def __eq__(self, other):
+            return type(self) is type(other) and all(
+                getattr(self, field) == getattr(other, field) for field in self.__struct_fields__
+            )
+
+        def __repr__(self):
+            fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__struct_fields__)
+            return f"{type(self).__name__}({fields})"
+
+
+# Модели ---------------------------------------------------------------------
+class Campus(Record):
+    id: Optional[uuid.UUID] = None
+    shortName: Optional[str] = None
+    fullName: Optional[str] = None
+
+
+class CampusList(Record):
+    campuses: List[Campus] = []
+
+
+class Coalition(Record):
+    coalitionId: Optional[int] = None
+    name: Optional[str] = None
+
+
+class CoalitionList(Record):
+    coalitions: List[Coalition] = []
+
+
+class ParticipantCampus(Record):
+    id: Optional[uuid.UUID] = None
+    shortName: Optional[str] = None
+
+
+class Participant(Record):
+    login: Optional[str] = None
+    className: Optional[str] = None
+    parallelName: Optional[str] = None
+    expValue: Optional[int] = None
+    level: Optional[int] = None
+    expToNextLevel: Optional[int] = None
+    campus: Optional[ParticipantCampus] = None
+    status: Optional[str] = None
+
+
+class Points(Record):
+    peerReviewPoints: Optional[int] = None
+    codeReviewPoints: Optional[int] = None
+    coins: Optional[int] = None
+
+
+class Feedback(Record):
+    averageVerifierPunctuality: Optional[float] = None
+    averageVerifierInterest: Optional[float] = None
+    averageVerifierThoroughness: Optional[float] = None
+    averageVerifierFriendliness: Optional[float] = None
+
+
+class Project(Record):
+    id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    type: Optional[str] = None
+    durationHours: Optional[int] = None
+    xp: Optional[int] = None
+    courseId: Optional[int] = None
+
+
+class Credentials(Record):
+    studentId: Optional[uuid.UUID] = None
+    userId: Optional[uuid.UUID] = None
+    schoolId: Optional[uuid.UUID] = None
+    isActive: Optional[bool] = None
+    isGraduate: Optional[bool] = None
+
+
+class _CredentialsSchool21(Record):
+    getStudentByLogin: Optional[Credentials] = None
+
+
+class _CredentialsData(Record):
+    school21: Optional[_CredentialsSchool21] = None
+
+
+class CredentialsResponse(Record):
+    """Ответ publicProfileGetCredentialsByLogin: {'data': {'school21': {'getStudentByLogin': ...}}}."""
+    data: Optional[_CredentialsData] = None
+
+    @property
+    def credentials(self) -> Optional[Credentials]:
+        if self.data is None or self.data.school21 is None:
+            return None
+        return self.data.school21.getStudentByLogin
+
+
+# Декодирование ----------------------------------------------------------------
+_decoders: Dict[type, Any] = {}
+
+
+def decode(data: Union[bytes, str], model: Type[T]) -> T:
+    """Декодирует JSON-ответ сразу в модель (с msgspec — без промежуточных dict)."""
+    if msgspec is not None:
+        decoder = _decoders.get(model)
+        if decoder is None:
+            decoder = _decoders[model] = msgspec.json.Decoder(model)
+        return decoder.decode(data)
+    return convert(json_backend.loads(data), model)
+
+
+def convert(value: Any, model: Type[T]) -> T:
+    """Преобразует уже разобранный JSON (например, из кэша) в модель."""
+    if msgspec is not None:
+        return msgspec.convert(value, model)
+    return _convert(value, model)
+
+
+def to_builtins(value: Any) -> Any:
+    """Модель → dict/list, пригодные для json_backend.dumps и кэша."""
+    if msgspec is not None:
+        return msgspec.to_builtins(value)
+    if isinstance(value, Record):
+        return {
+            field: to_builtins(getattr(value, field))
+            for field in value.__struct_fields__ if getattr(value, field) is not None
+        }
+    if isinstance(value, list):
+        return [to_builtins(item) for item in value]
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _convert(value: Any, annotation: Any) -> Any:
+    if value is None:
+        return None
+    origin = typing.get_origin(annotation)
+    if origin is Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        return _convert(value, annotation)
+    if origin in (list, List):
+        if not isinstance(value, list):
+            raise ValidationError(f"Ожидался список, получено {type(value).__name__}")
+        (item_type,) = typing.get_args(annotation)
+        return [_convert(item, item_type) for item in value]
+    if isinstance(annotation, type) and issubclass(annotation, Record):
+        if not isinstance(value, dict):
+            raise ValidationError(f"{annotation.__name__}: ожидался объект, получено {type(value).__name__}")
+        hints = _hints(annotation)
+        return annotation(**{
+            field: _convert(value[field], hints[field]) for field in annotation.__struct_fields__ if field in value
+        })
+    if annotation is uuid.UUID:
+        if isinstance(value, uuid.UUID):
+            return value
+        try:
+            return uuid.UUID(value)
+        except (TypeError, ValueError, AttributeError):
+            raise ValidationError(f"Ожидался UUID, получено {value!r}") from None
+    if annotation in _SCALARS:
+        # bool — подкласс int, поэтому True не должен проходить как int;
+        # целое допустимо там, где ждут float (как в msgspec)
+        if isinstance(value, bool) and annotation is not bool:
+            raise ValidationError(f"Ожидался {annotation.__name__}, получено bool")
+        if annotation is float and isinstance(value, int):
+            return float(value)
+        if not isinstance(value, annotation):
+            raise ValidationError(f"Ожидался {annotation.__name__}, получено {type(value).__name__}")
+    return value
+
+
+_SCALARS = (int, float, bool, str)
+
+
+_type_hints: Dict[type, Dict[str, Any]] = {}
+
+
+def _hints(model: type) -> Dict[str, Any]:
+    hints = _type_hints.get(model)
+    if hints is None:
+        hints = _type_hints[model] = typing.get_type_hints(model)
+    return hints
@@ -1,8 +1,14 @@
 # import sqlite3
 import enum
+import hashlib
+import io
+import itertools
 import json
+import re
+import threading
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Optional, Dict, Any, List, Callable
 from functools import wraps
@@ -12,23 +18,108 @@ import sqlalchemy
 from sshtunnel import SSHTunnelForwarder
 
 import s21_api
-import pandas as pd
 import asyncio
+try:
+    import pandas as pd
+except ImportError:  # pandas нужен только для _upsert/_copy_upsert с DataFrame
+    pd = None
 import psycopg2
 from getpass import getpass
-from sqlalchemy import JSON, create_engine
+from sqlalchemy import JSON, create_engine, event
 from sqlalchemy import String, Integer, DateTime, UUID, Boolean, Float, text
 from sqlalchemy import Table, Column, MetaData, Enum as EnumType
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import ForeignKey
 from sqlalchemy import PrimaryKeyConstraint
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+from sqlalchemy.pool import NullPool
 
-from model_porject_info import create_from_json, ProjectDatabase
+from model_porject_info import create_many_from_json, create_pooled_engine, ingest_parallel
+from crawl_pipeline import Pipeline, Stage
+from record_normalizer import RecordNormalizer
+import json_backend
+
+state_meta = MetaData()
+
+# changedAt для логина, содержимое которого ещё ни разу не менялось
+NEVER_CHANGED = datetime(1970, 1, 1)
+
+# Хэш содержимого и время последней загрузки по каждому логину и эндпоинту
+participantFetchState = Table(
+    'participantFetchState',
+    state_meta,
+    Column('login', String, nullable=False),
+    Column('endpoint', String, nullable=False),
+    Column('contentHash', String, nullable=False),
+    Column('fetchedAt', DateTime, nullable=False),
+    Column('changedAt', DateTime, nullable=False),
+    PrimaryKeyConstraint('login', 'endpoint'),
+)
+
+# DDL, после которого закэшированные описания таблиц могут устареть
+DDL_STATEMENT = re.compile(r'^\s*(CREATE|ALTER|DROP|TRUNCATE)\s+(TABLE|TYPE|INDEX)', re.IGNORECASE)
 
 class ApiDataSaver:
-    def __init__(self, db_path='school21.db'):
+    # Эндпоинты инкрементального обновления: метод School21API и обработчик ответа
+    INCREMENTAL_ENDPOINTS = {
+        'basic': ('get_participant_by_login', 'process_participants_basic'),
+        'points': ('get_points_by_login', 'process_participants_points'),
+        'feedback': ('get_participant_feedback_by_login', 'process_participants_feedback'),
+        'credentials': ('publicProfileGetCredentialsByLogin', 'process_participants_credentials'),
+    }
+
+    # Проекции ответов API на колонки таблиц: (таблица, колонки, пути в ответе)
+    NORMALIZERS = {
+        'campuses': ('campuses', ['id', 'shortName', 'fullName'], {}),
+        'coalitions': ('coalitions', ['coalitionId', 'name', 'campusId'], {}),
+        'participants_by_coalition': ('participants', ['login', 'coalitionId'], {}),
+        'participants_basic': (
+            'participants',
+            ['login', 'className', 'parallelName', 'expValue', 'level',
+             'expToNextLevel', 'campusShortName', 'status'],
+            {'campusShortName': 'campus.shortName'},
+        ),
+        'participants_points': (
+            'participants', ['login', 'peerReviewPoints', 'codeReviewPoints', 'coins'], {},
+        ),
+        'participants_feedback': (
+            'participants',
+            ['login', 'averageVerifierPunctuality', 'averageVerifierInterest',
+             'averageVerifierThoroughness', 'averageVerifierFriendliness'],
+            {},
+        ),
+        'participants_credentials': (
+            'participants',
+            ['login', 'studentId', 'userId', 'isActive', 'isGraduate'],
+            {
+                column: f'data.school21.getStudentByLogin.{column}'
+                for column in ['studentId', 'userId', 'isActive', 'isGraduate']
+            },
+        ),
+    }
+
+    def __init__(
+        self,
+        db_path='school21.db',
+        buffer_size: int = 5000,
+        buffer_interval: float = 5.0,
+        driver: str = 'psycopg2',
+        engine_options: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        :param driver: Драйвер SQLAlchemy (psycopg2 или psycopg для psycopg 3).
+        :param engine_options: Параметры create_pooled_engine (pool_size, statement_timeout_ms, ...).
+        """
+        if driver not in ('psycopg2', 'psycopg'):
+            # Путь COPY реализован только для этих драйверов (см. _copy_from)
+            raise ValueError(f"Неподдерживаемый драйвер {driver}: нужен psycopg2 или psycopg")
         self.db_path = db_path
+        # Буфер записи: строки копятся по таблицам и первичным ключам до flush
+        self.buffer_size = buffer_size
+        self.buffer_interval = buffer_interval
+        self._buffers: Dict[str, Dict[tuple, dict]] = {}
+        self._buffered_at: Dict[str, float] = {}
+        self._buffer_lock = threading.RLock()
         db_params = {
             'user_name' : 'postgres',
             'host' : 'localhost',
@@ -36,23 +127,34 @@ class ApiDataSaver:
             'dbname' : self.db_path,
         }
         
-        base_engine = create_engine(
-            f"postgresql+psycopg2://{db_params['user_name']}@{db_params['host']}:{db_params['port']}/postgres",
-        )
-        with base_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
-            result = conn.execute(
-                text("SELECT 1 FROM pg_catalog.pg_database WHERE datname = :dbname;"),
-                {'dbname': db_params['dbname']}
-            )
-            if not result.fetchone():
-                conn.execute(
-                    text(f"CREATE DATABASE {db_params['dbname']};")
+        server_url = f"postgresql+{driver}://{db_params['user_name']}@{db_params['host']}:{db_params['port']}"
+
+        # Служебное соединение только для CREATE DATABASE: без пула и сразу закрывается
+        base_engine = create_engine(f"{server_url}/postgres", poolclass=NullPool)
+        try:
+            with base_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                result = conn.execute(
+                    text("SELECT 1 FROM pg_catalog.pg_database WHERE datname = :dbname;"),
+                    {'dbname': db_params['dbname']}
                 )
-        self.engine = create_engine(f"postgresql://{db_params['user_name']}@{db_params['host']}:{db_params['port']}/{db_params['dbname']}")
+                if not result.fetchone():
+                    conn.execute(
+                        text(f"CREATE DATABASE {db_params['dbname']};")
+                    )
+        finally:
+            base_engine.dispose()
+        # Настройки пула нужны и процессам-воркерам ingest_parallel
+        self.engine_options = dict(engine_options or {})
+        self.engine = create_pooled_engine(f"{server_url}/{db_params['dbname']}", **self.engine_options)
         self.meta = MetaData()
         self.meta.reflect(self.engine)
+        # Описания таблиц отражаются один раз и сбрасываются после DDL через этот engine
+        self._tables: Dict[str, Table] = {}
+        self._normalizers: Dict[str, RecordNormalizer] = {}
+        event.listen(self.engine, 'after_cursor_execute', self._on_execute)
 
         self._create_tables()
+        state_meta.create_all(self.engine)
 
     @staticmethod
     def batch_async_requests(concurrency_limit: int = 10):
@@ -81,7 +183,108 @@ class ApiDataSaver:
 
         return decorator     
 
-    def _upsert(self, df: pd.DataFrame, table: Table):
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if DDL_STATEMENT.match(statement):
+            self.invalidate_tables()
+
+    def invalidate_tables(self, name: Optional[str] = None):
+        """Сбрасывает кэш описаний таблиц (например, после миграции извне)."""
+        if name is None:
+            self._tables.clear()
+            self._normalizers.clear()
+            self.meta.clear()
+        else:
+            self._tables.pop(name, None)
+            if name in self.meta.tables:
+                self.meta.remove(self.meta.tables[name])
+            self._normalizers = {
+                key: normalizer for key, normalizer in self._normalizers.items()
+                if normalizer.table.name != name
+            }
+
+    def _table(self, name: str) -> Table:
+        """
+        Описание таблицы из кэша. Таблицы, отражённые в __init__, берутся из self.meta;
+        из базы читается только таблица, которой там нет (новая или сброшенная после DDL).
+        """
+        table = self._tables.get(name)
+        if table is None:
+            table = self.meta.tables.get(name)
+            if table is None:
+                table = Table(name, self.meta, autoload_with=self.engine)
+            self._tables[name] = table
+        return table
+
+    def _normalizer(self, name: str) -> RecordNormalizer:
+        """Нормализатор из NORMALIZERS; план строится один раз."""
+        normalizer = self._normalizers.get(name)
+        if normalizer is None:
+            table_name, columns, sources = self.NORMALIZERS[name]
+            normalizer = RecordNormalizer(self._table(table_name), columns, sources)
+            self._normalizers[name] = normalizer
+        return normalizer
+
+    def _save(self, name: str, rows: List[tuple]):
+        normalizer = self._normalizer(name)
+        self._upsert_records(normalizer.table, normalizer.columns, rows)
+
+    def buffer_rows(self, table_name: str, records: List[dict]):
+        """
+        Добавляет строки в буфер записи. Строки с одинаковым первичным ключом
+        сливаются: непустые значения новой строки дополняют старую.
+        Буфер таблицы сбрасывается при достижении buffer_size строк
+        или через buffer_interval секунд после первой строки.
+        """
+        table = self._table(table_name)
+        primary_keys = [col.name for col in table.primary_key.columns]
+        with self._buffer_lock:
+            buffer = self._buffers.setdefault(table_name, {})
+            self._buffered_at.setdefault(table_name, time.monotonic())
+            for record in records:
+                key = tuple(record.get(pk) for pk in primary_keys)
+                merged = buffer.setdefault(key, {})
+                merged.update({k: v for k, v in record.items() if v is not None})
+            if (
+                len(buffer) >= self.buffer_size
+                or time.monotonic() - self._buffered_at[table_name] >= self.buffer_interval
+            ):
+                self.flush(table_name)
+
+    def flush_expired(self):
+        """Сбрасывает буферы, в которых строки лежат дольше buffer_interval."""
+        with self._buffer_lock:
+            now = time.monotonic()
+            for name, buffered_at in list(self._buffered_at.items()):
+                if now - buffered_at >= self.buffer_interval:
+                    self.flush(name)
+
+    def flush(self, table_name: Optional[str] = None):
+        """Записывает буфер таблицы (или все буферы) в базу."""
+        with self._buffer_lock:
+            names = [table_name] if table_name is not None else list(self._buffers)
+            for name in names:
+                rows = list(self._buffers.get(name, {}).values())
+                # Строки с разным набором колонок пишутся отдельно,
+                # иначе отсутствующие колонки затёрли бы данные значениями NULL
+                groups: Dict[tuple, List[dict]] = {}
+                for row in rows:
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                for columns, group in groups.items():
+                    self._upsert_records(
+                        self._table(name), list(columns),
+                        [tuple(row[col] for col in columns) for row in group],
+                    )
+                # Буфер очищается только после успешной записи
+                self._buffers.pop(name, None)
+                self._buffered_at.pop(name, None)
+
+    # Начиная с этого размера _upsert идёт через COPY во временную таблицу
+    COPY_THRESHOLD = 1000
+    COPY_CHUNK_SIZE = 50000
+
+    def _upsert(self, df: 'pd.DataFrame', table: Table):
+        if len(df) >= self.COPY_THRESHOLD:
+            return self._copy_upsert(df, table)
         with self.engine.connect() as connection:
             # Преобразуем DataFrame в список словарей
             data = df.to_dict(orient='records')
@@ -113,6 +316,134 @@ class ApiDataSaver:
             connection.execute(stmt)
             connection.commit()
 
+    def _copy_upsert(self, df: 'pd.DataFrame', table: Table, chunk_size: Optional[int] = None):
+        """
+        Upsert больших DataFrame: каждая пачка загружается через COPY во временную
+        (нежурналируемую) таблицу и сливается в целевую одним
+        INSERT ... SELECT ... ON CONFLICT. Семантика та же, что у _upsert:
+        пустые колонки не перезаписывают существующие значения.
+        """
+        chunk_size = chunk_size or self.COPY_CHUNK_SIZE
+        primary_keys = [col.name for col in table.primary_key.columns]
+        columns = [col for col in df.columns if col in table.columns]
+        non_empty_columns = [col for col in columns if not df[col].isna().all()]
+        update_columns = [col for col in non_empty_columns if col not in primary_keys]
+
+        # Повторы ключа в одной пачке ломают ON CONFLICT DO UPDATE — оставляем последний
+        df = df[columns].drop_duplicates(subset=primary_keys, keep='last')
+        for col in columns:
+            # Целые с пропусками pandas хранит как float ("3.0"), что COPY в integer не примет
+            if isinstance(table.columns[col].type, Integer) and df[col].dtype.kind == 'f':
+                df[col] = df[col].astype('Int64')
+            # JSON-колонки передаются строками
+            if df[col].map(lambda v: isinstance(v, (dict, list))).any():
+                df[col] = df[col].map(lambda v: json_backend.dumps(v).decode() if isinstance(v, (dict, list)) else v)
+
+        # Пропуски (NaN, NA) — None, чтобы в CSV они отличались от пустых строк
+        df = df.astype(object).where(df.notna(), None)
+
+        def chunks():
+            for start in range(0, len(df), chunk_size):
+                buffer = io.StringIO()
+                buffer.writelines(
+                    RecordNormalizer.csv_line(row)
+                    for row in df.iloc[start:start + chunk_size].itertuples(index=False, name=None)
+                )
+                buffer.seek(0)
+                yield buffer
+
+        self._copy_merge(table, columns, update_columns, chunks())
+
+    def _merge_sql(self, table: Table, columns: List[str], update_columns: List[str], source: str) -> str:
+        quote = self.engine.dialect.identifier_preparer.quote
+        primary_keys = [col.name for col in table.primary_key.columns]
+        column_list = ', '.join(quote(col) for col in columns)
+        merge = f'INSERT INTO {quote(table.name)} ({column_list}) SELECT {column_list} FROM {source}'
+        if update_columns:
+            merge += (
+                f" ON CONFLICT ({', '.join(quote(col) for col in primary_keys)}) DO UPDATE SET "
+                + ', '.join(f'{quote(col)} = EXCLUDED.{quote(col)}' for col in update_columns)
+            )
+        else:
+            merge += ' ON CONFLICT DO NOTHING'
+        return merge
+
+    def _copy_merge(self, table: Table, columns: List[str], update_columns: List[str], chunks):
+        """Загружает CSV-пачки через COPY во временную таблицу и сливает каждую в table."""
+        quote = self.engine.dialect.identifier_preparer.quote
+        column_list = ', '.join(quote(col) for col in columns)
+        merge = self._merge_sql(table, columns, update_columns, '"_staging"')
+
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                for buffer in chunks:
+                    # Временная таблица без NOT NULL, только с нужными колонками
+                    cursor.execute(
+                        f'CREATE TEMP TABLE "_staging" ON COMMIT DROP AS '
+                        f'SELECT {column_list} FROM {quote(table.name)} WITH NO DATA'
+                    )
+                    self._copy_from(cursor, f'COPY "_staging" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+                    cursor.execute(merge)
+                    connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    COPY_READ_SIZE = 1 << 16
+
+    def _copy_from(self, cursor, sql: str, buffer: io.StringIO):
+        """COPY ... FROM STDIN из буфера: у psycopg2 это copy_expert, у psycopg 3 — cursor.copy()."""
+        if self.engine.dialect.driver == 'psycopg2':
+            cursor.copy_expert(sql, buffer)
+            return
+        with cursor.copy(sql) as copy:
+            while True:
+                data = buffer.read(self.COPY_READ_SIZE)
+                if not data:
+                    break
+                copy.write(data)
+
+    def _upsert_records(self, table: Table, columns: List[str], rows: List[tuple]):
+        """
+        Upsert готовых кортежей (см. RecordNormalizer) без pandas.
+        Как и _upsert, не перезаписывает существующие значения колонками,
+        пустыми во всех строках; повторы первичного ключа схлопываются в последнюю строку.
+        """
+        if not rows:
+            return
+        primary_keys = [col.name for col in table.primary_key.columns]
+        key_index = [columns.index(pk) for pk in primary_keys]
+        rows = list({tuple(row[i] for i in key_index): row for row in rows}.values())
+        update_columns = [
+            col for i, col in enumerate(columns)
+            if col not in primary_keys and any(row[i] is not None for row in rows)
+        ]
+
+        if len(rows) >= self.COPY_THRESHOLD:
+            def chunks():
+                for start in range(0, len(rows), self.COPY_CHUNK_SIZE):
+                    buffer = io.StringIO()
+                    buffer.writelines(RecordNormalizer.csv_line(row) for row in rows[start:start + self.COPY_CHUNK_SIZE])
+                    buffer.seek(0)
+                    yield buffer
+
+            self._copy_merge(table, columns, update_columns, chunks())
+            return
+
+        stmt = insert(table)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=primary_keys,
+                set_={col: stmt.excluded[col] for col in update_columns},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing()
+        with self.engine.begin() as connection:
+            connection.execute(stmt, [dict(zip(columns, row)) for row in rows])
+
     def _create_tables(self):
         Base = declarative_base()
         
@@ -194,175 +525,444 @@ class ApiDataSaver:
         # Base.metadata.create_all(bind=self.engine)
 
     def process_campuses(self, campuses):
-        print(Table('campuses',self.meta,autoload_with=self.engine))
         try: 
-            df = pd.DataFrame(
-                pd.json_normalize(
-                    campuses['campuses']
-                    )
-                )   
-            self._upsert(df, Table('campuses', self.meta, autoload_with=self.engine))
+            self._save('campuses', self._normalizer('campuses').many(campuses['campuses']))
         except Exception as e:
-            if self.engine:
-                self.engine.dispose()
             print(f'Error processing campuses: {e}')
+            raise
     
     def process_coalitions(self, coalitions: dict):
         try:
+            normalizer = self._normalizer('coalitions')
             for campusId, coalitions in coalitions.items():
-                df = pd.DataFrame(
-                    pd.json_normalize(
-                        coalitions['coalitions']
-                        )
-                    )
-                df['campusId'] = campusId
-                print(df)   
-                self._upsert(df, Table('coalitions', self.meta, autoload_with=self.engine))
+                rows = normalizer.many(coalitions['coalitions'], campusId=campusId)
+                print(f'{campusId}: {len(rows)} coalitions')
+                self._save('coalitions', rows)
         except Exception as e:
-            if self.engine:
-                self.engine.dispose()
             print(f'Error processing coalitions: {e}')
+            raise
 
-    def process_participants_by_coalition(self, participants: dict):
+    def process_participants_by_coalition(self, participants: dict) -> List[Any]:
+        """
+        :return: coalitionId, участники которых сохранены. Коалиция без участников
+            (пустой список) тоже считается сохранённой, None (повторы исчерпаны) — нет.
+        """
         try:
+            saved = []
             for coalitionId, participants in participants.items():
-                if isinstance(participants, dict):    
-                    df = pd.DataFrame({'login' : participants['participants']})
-                    df['coalitionId'] = coalitionId
-                    self._upsert(df, Table('participants', self.meta, autoload_with=self.engine))
-                    
+                if participants is None:
+                    continue
+                logins = participants['participants'] if isinstance(participants, dict) else participants
+                self._save('participants_by_coalition', [(login, int(coalitionId)) for login in logins])
+                saved.append(coalitionId)
+            return saved
         except Exception as e:
-            if self.engine:
-                self.engine.dispose()
             print(f'Error processing participants: {e}')
             traceback.print_exc() 
+            raise
+
+    async def process_participants_pages(self, pages, **columns):
+        """
+        Сохраняет участников по мере поступления страниц из асинхронного генератора,
+        например api.iter_participants_by_coalition_id(coalitionId).
+
+        :param pages: Асинхронный итератор страниц вида {'participants': [login, ...]}.
+        :param columns: Значения, общие для всех строк (coalitionId=..., campusShortName=...).
+        """
+        try:
+            normalizer = RecordNormalizer(self._table('participants'), ['login', *columns])
+            async for page in pages:
+                rows = [normalizer({}, login=login, **columns) for login in page['participants']]
+                self._upsert_records(normalizer.table, normalizer.columns, rows)
+        except Exception as e:
+            print(f'Error processing participants: {e}')
+            traceback.print_exc()
+            raise
+
+    def _process_by_login(self, name: str, responses: dict) -> List[str]:
+        """
+        Нормализует ответы вида {login: payload} через NORMALIZERS[name] и сохраняет их.
+
+        :return: Логины, ответы которых сохранены (пустые ответы и ответы с GraphQL-ошибками пропускаются).
+        """
+        normalizer = self._normalizer(name)
+        saved = [
+            login for login, payload in responses.items()
+            if payload and not (isinstance(payload, dict) and payload.get('errors'))
+        ]
+        self._save(name, [normalizer(responses[login], login=login) for login in saved])
+        return saved
 
     def process_participants_points(self, points: dict):
         try:
-            df = pd.DataFrame(points).T.reset_index().rename(columns={'index' : 'login'})
-            self._upsert(df, Table('participants', self.meta, autoload_with=self.engine))            
+            return self._process_by_login('participants_points', points)
         except Exception as e:
-            if self.engine:
-                self.engine.dispose()
             print(f'Error processing points: {e}')
             traceback.print_exc()  
+            raise
 
-    async def process_participant_basic_info(self, logins: list[str]):
-        # logins = pd.read_sql('''
-        # SELECT p.login 
-        # FROM participants AS p 
-        # WHERE p.login NOT IN ('blossola', 'bloodywo') 
-        # ORDER BY p.login ASC
-        # OFFSET 20450
-        # '''
-        # , self.engine)
-        # points = await self.api.get_points_by_login(logins['login'].values[10000:])
-        # self.process_participants_points(points)
-
-        # def split_list(lst, n):
-        #     size = len(lst) // n
-        #     remainder = len(lst) % n
-        #     result = []
-        #     start = 0
-        #     for i in range(n):
-        #         end = start + size + (1 if i < remainder else 0)
-        #         result.append(lst[start:end])
-        #         start = end
-        #     return result
+    def process_participants_credentials(self, credentials: dict):
+        """
+        Сохраняет ответы publicProfileGetCredentialsByLogin: {login: {'data': {'school21': {'getStudentByLogin': {...}}}}}.
+        """
+        try:
+            return self._process_by_login('participants_credentials', credentials)
+        except Exception as e:
+            print(f'Error processing credentials: {e}')
+            traceback.print_exc()
+            raise
 
-        
-        # logins = split_list(list(logins['login'].values), 1)
-        
+    def process_participants_basic(self, basic_info: dict):
+        """Сохраняет ответы get_participant_by_login: {login: {login, expValue, level, campus, ...}}."""
+        try:
+            return self._process_by_login('participants_basic', basic_info)
+        except Exception as e:
+            print(f'Error processing basic info: {e}')
+            traceback.print_exc()
+            raise
 
-        # for i, login in enumerate(logins):
-        #     print(i) 
-        #     basicInfo = await self.api.get_participant_by_login(login)
-        #     df = pd.json_normalize(basicInfo.values())
-        #     df.rename(columns={'campus.shortName':'campusShortName'}, inplace=True)
-        #     df.drop('campus.id',inplace=True,axis=1)
-        #     self._upsert(df, Table('participants', self.meta, autoload_with=self.engine))
+    def process_participants_feedback(self, feedback: dict):
+        try:
+            return self._process_by_login('participants_feedback', feedback)
+        except Exception as e:
+            print(f'Error processing feedback: {e}')
+            traceback.print_exc()
+            raise
 
-        # for i, login in enumerate(logins):
-        #     print(i) 
-        #     basicInfo = await self.api.get_participant_feedback_by_login(login)           
-        #     df = pd.DataFrame(basicInfo).T.reset_index().rename(columns={'index':'login'})
+    @staticmethod
+    def _content_hash(payload) -> str:
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()
+        ).hexdigest()
 
-        #     self._upsert(df, Table('participants', self.meta, autoload_with=self.engine))
-        
-        for i, login in enumerate(logins):
-            print(i) 
-            basicInfo = await self.api.get_participant_credentials_by_login(login)
-            df = pd.DataFrame(basicInfo).T.reset_index().rename(columns={'index':'login'})
-            df.drop(columns=['schoolId'], inplace=True)
-            self._upsert(df, Table('participants', self.meta, autoload_with=self.engine))
+    def _changed_logins(self, endpoint: str, hashes: Dict[str, str]) -> List[str]:
+        """Логины, у которых ответ эндпоинта отличается от сохранённого."""
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                sqlalchemy.select(participantFetchState.c.login, participantFetchState.c.contentHash)
+                .where(participantFetchState.c.endpoint == endpoint)
+                .where(participantFetchState.c.login.in_(list(hashes)))
+            )
+            known = {row.login: row.contentHash for row in rows}
+        return [login for login, content_hash in hashes.items() if known.get(login) != content_hash]
+
+    def _record_fetch(self, endpoint: str, hashes: Dict[str, str]):
+        if not hashes:
+            return
+        now = datetime.now()
+        # Первая загрузка — не изменение: иначе после первой записи signal-эндпоинта
+        # changedAt > fetchedAt выполнялось бы для всех логинов и свежий обход
+        # перезапрашивался бы целиком
+        stmt = insert(participantFetchState).values([
+            {'login': login, 'endpoint': endpoint, 'contentHash': content_hash,
+             'fetchedAt': now, 'changedAt': NEVER_CHANGED}
+            for login, content_hash in hashes.items()
+        ])
+        # changedAt сдвигается только при изменении содержимого
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['login', 'endpoint'],
+            set_={
+                'contentHash': stmt.excluded.contentHash,
+                'fetchedAt': stmt.excluded.fetchedAt,
+                'changedAt': sqlalchemy.case(
+                    (participantFetchState.c.contentHash != stmt.excluded.contentHash, stmt.excluded.fetchedAt),
+                    else_=participantFetchState.c.changedAt,
+                ),
+            },
+        )
+        with self.engine.begin() as connection:
+            connection.execute(stmt)
+
+    def stale_logins(
+        self,
+        endpoint: str,
+        max_age: timedelta = timedelta(days=1),
+        signal_endpoint: Optional[str] = 'basic',
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Логины, которые стоит перезапросить, в порядке приоритета:
+        ни разу не загруженные; те, чей ответ signal_endpoint (expValue, level и т.п.)
+        изменился после последней загрузки endpoint; затем самые давние.
+
+        :param max_age: Возраст, после которого данные считаются устаревшими.
+        :param signal_endpoint: Дешёвый эндпоинт, изменение которого говорит об активности.
+        :param limit: Максимальное количество логинов.
+        """
+        query = text('''
+            SELECT p.login
+            FROM participants AS p
+            LEFT JOIN "participantFetchState" AS s
+                ON s.login = p.login AND s.endpoint = :endpoint
+            LEFT JOIN "participantFetchState" AS a
+                ON a.login = p.login AND a.endpoint = :signal_endpoint
+            WHERE s.login IS NULL
+                OR s."fetchedAt" < :cutoff
+                OR a."changedAt" > s."fetchedAt"
+            ORDER BY
+                (s.login IS NULL) DESC,
+                (a."changedAt" > s."fetchedAt") DESC NULLS LAST,
+                s."fetchedAt" ASC NULLS FIRST
+            LIMIT :limit
+        ''')
+        with self.engine.connect() as connection:
+            rows = connection.execute(query, {
+                'endpoint': endpoint,
+                'signal_endpoint': signal_endpoint if signal_endpoint != endpoint else None,
+                'cutoff': datetime.now() - max_age,
+                'limit': limit,
+            })
+            return [row.login for row in rows]
+
+    async def refresh_incremental(
+        self,
+        api: s21_api.School21API,
+        endpoint: str,
+        max_age: timedelta = timedelta(days=1),
+        limit: Optional[int] = None,
+        batch_size: int = 500,
+    ):
+        """
+        Инкрементально обновляет данные участников по одному эндпоинту из INCREMENTAL_ENDPOINTS.
+        Запрашиваются только устаревшие или активные логины, а в participants
+        записываются только ответы, хэш которых изменился.
+        """
+        method, process = self.INCREMENTAL_ENDPOINTS[endpoint]
+        logins = self.stale_logins(endpoint, max_age, limit=limit)
+        print(f'{endpoint}: {len(logins)} logins to refresh')
+        for start in range(0, len(logins), batch_size):
+            results = await getattr(api, method)(logins[start:start + batch_size])
+            hashes = {
+                login: self._content_hash(payload)
+                for login, payload in results.items() if payload is not None
+            }
+            changed = self._changed_logins(endpoint, hashes)
+            if changed:
+                getattr(self, process)({login: results[login] for login in changed})
+            self._record_fetch(endpoint, hashes)
+            print(f'{endpoint}: {start + len(hashes)}/{len(logins)}, changed {len(changed)}')
+
+    def _normalize_participant(self, endpoint: str, login: str, payload: dict) -> Optional[dict]:
+        """Приводит ответ эндпоинта из INCREMENTAL_ENDPOINTS к строке таблицы participants."""
+        if not payload:
+            return None
+        normalizer = self._normalizer(f'participants_{endpoint}')
+        row = normalizer(payload, login=login)
+        return {col: value for col, value in zip(normalizer.columns, row) if value is not None}
+
+    async def process_participant_basic_info(
+        self,
+        api: s21_api.School21API,
+        logins: List[str],
+        endpoint: str = 'credentials',
+        concurrency: int = 50,
+    ):
+        """
+        Загружает данные участников по одному логину и пишет их в базу параллельно с загрузкой:
+        concurrency корутин запрашивают API и кладут строки в очередь AsyncDbWriter,
+        который пачками сохраняет их в отдельном потоке. Ограниченная очередь
+        притормаживает загрузку, если база не успевает.
+
+        :param endpoint: Ключ INCREMENTAL_ENDPOINTS (basic, points, feedback, credentials).
+        :param concurrency: Количество одновременно работающих загрузчиков.
+        """
+        method = getattr(api, self.INCREMENTAL_ENDPOINTS[endpoint][0])
+        pending = iter(logins)
+        # GraphQL-эндпоинт объединяет логины в один запрос, поэтому загрузчик берёт их пачкой
+        chunk_size = api.gql_batch_size if endpoint == 'credentials' else 1
+
+        async with AsyncDbWriter(self) as writer:
+            async def produce():
+                while chunk := list(itertools.islice(pending, chunk_size)):
+                    response = await method(chunk)
+                    for login in chunk:
+                        record = self._normalize_participant(endpoint, login, response.get(login))
+                        if record:
+                            await writer.put('participants', record)
+
+            await asyncio.gather(*[produce() for _ in range(concurrency)])
+        print(f'{endpoint}: {writer.written} rows written')
 
     def close(self):
-        if self.engine:
+        # engine может отсутствовать, если __init__ упал на подключении
+        if getattr(self, 'engine', None):
+            if self._buffers:
+                self.flush()
             self.engine.dispose()
     
     def __del__(self):
         self.close()
 
+class AsyncDbWriter:
+    """
+    Фоновый писатель в базу: корутины кладут строки в ограниченную asyncio.Queue,
+    а единственный потребитель забирает всё накопившееся (до batch_size) и
+    передаёт пачку в буфер ApiDataSaver.buffer_rows в пуле потоков, не блокируя event loop.
+    Если новых строк нет flush_interval секунд, просроченные буферы сбрасываются
+    по таймеру, а не при следующей записи.
+
+    async with AsyncDbWriter(saver) as writer:
+        await writer.put('participants', {'login': ..., ...})
+
+    :param saver: ApiDataSaver, через который выполняется запись.
+    :param maxsize: Размер очереди; при заполнении put() ждёт (backpressure).
+    :param batch_size: Максимальное количество строк в одной транзакции.
+    :param flush_interval: Период проверки буферов при простое (по умолчанию saver.buffer_interval).
+    """
+
+    def __init__(
+        self,
+        saver: ApiDataSaver,
+        maxsize: int = 5000,
+        batch_size: int = 1000,
+        flush_interval: Optional[float] = None,
+    ):
+        self.saver = saver
+        self.queue = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else saver.buffer_interval
+        self.written = 0
+        self._task = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            self._task.cancel()
+
+    async def put(self, table: str, record: dict):
+        if self._task.done():
+            self._task.result()
+            raise RuntimeError('AsyncDbWriter is closed')
+        put = asyncio.ensure_future(self.queue.put((table, record)))
+        await asyncio.wait({put, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            # Писатель упал, пока очередь была полна — пробрасываем его ошибку
+            put.cancel()
+            self._task.result()
+
+    async def close(self):
+        """Дожидается записи всего, что уже в очереди, и сбрасывает буфер ApiDataSaver."""
+        await self.queue.put(None)
+        await self._task
+        await asyncio.to_thread(self.saver.flush)
+
+    async def _run(self):
+        finished = False
+        while not finished:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                # Обход замедлился или встал — порог по времени срабатывает сам
+                await asyncio.to_thread(self.saver.flush_expired)
+                continue
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: List[tuple]):
+        by_table: Dict[str, List[dict]] = {}
+        for table, record in batch:
+            by_table.setdefault(table, []).append(record)
+        for table, records in by_table.items():
+            self.saver.buffer_rows(table, records)
+            self.written += len(records)
+
+def build_pipeline(api: s21_api.School21API, api_data_saver: ApiDataSaver, project_workers: int = 1) -> Pipeline:
+    """
+    Обход API: campuses → coalitions → participants → credentials → projects.
+    Каждый шаг сохраняет чекпоинты, поэтому перезапуск продолжает с места падения.
+
+    :param project_workers: Число процессов для сохранения проектов (1 — в текущем процессе).
+    """
+    engine = api_data_saver.engine
+
+    def column(query: str) -> list:
+        with engine.connect() as connection:
+            return [row[0] for row in connection.execute(text(query))]
+
+    async def campuses(_):
+        api_data_saver.process_campuses(await api.get_campuses())
+
+    async def coalitions(campus_ids):
+        api_data_saver.process_coalitions(await api.get_coalitions_by_campus(campus_ids))
+
+    # Шаги возвращают элементы, которые действительно сохранены: чекпоинт ставится только на них
+    async def participants(coalition_ids):
+        return api_data_saver.process_participants_by_coalition(
+            await api.get_participants_by_coalition_id(coalition_ids)
+        )
+
+    async def credentials(logins):
+        return api_data_saver.process_participants_credentials(
+            await api.publicProfileGetCredentialsByLogin(logins)
+        )
+
+    def project_ids():
+        return [project['id'] for project in json_backend.load('projects.json')['projects']]
+
+    async def projects(goal_ids):
+        data = await api.getProjectInfo(goal_ids)
+        # Ответы без data (GraphQL-ошибки, исчерпанные повторы) не сохраняются и не отмечаются
+        fetched = [(goal_id, project['data']) for goal_id, project in data.items() if project and project.get('data')]
+        payloads = [payload for _, payload in fetched]
+        if project_workers > 1:
+            report = await asyncio.to_thread(
+                ingest_parallel, engine, payloads, project_workers,
+                engine_options=api_data_saver.engine_options,
+            )
+        else:
+            report = create_many_from_json(engine, payloads)
+        return [goal_id for index, (goal_id, _) in enumerate(fetched) if index not in report['failed']]
+
+    return Pipeline(engine, [
+        Stage('campuses', lambda: ['campuses'], campuses),
+        Stage(
+            'coalitions',
+            lambda: [str(i) for i in column('SELECT id FROM campuses')],
+            coalitions,
+            depends_on=['campuses'],
+        ),
+        Stage(
+            'participants',
+            lambda: column('SELECT "coalitionId" FROM coalitions'),
+            participants,
+            depends_on=['coalitions'],
+            batch_size=10,
+        ),
+        Stage(
+            'credentials',
+            lambda: column('SELECT login FROM participants ORDER BY login'),
+            credentials,
+            depends_on=['participants'],
+            batch_size=500,
+        ),
+        Stage('projects', project_ids, projects, batch_size=50 * project_workers),
+    ])
+
 async def main():
     api = s21_api.School21API()
     api_data_saver = ApiDataSaver('test2')
     try:
-        pass
-        # campuses = await api.get_campuses()
-        # api_data_saver.process_campuses(campuses)
-
-        # campuses = pd.read_sql('SELECT id FROM campuses', api_data_saver.engine)
-        # coalitions = await api.get_coalitions_by_campus(campuses['id'].values[:])
-        # api_data_saver.process_coalitions(coalitions)
-
-        # coalitions = pd.read_sql('SELECT * FROM coalitions', api_data_saver.engine)
-        # participants = await api.get_participants_by_coalition_id(coalitions['coalitionId'].values[:])
-        # api_data_saver.process_participants_by_coalition(participants)
-
-        # login = pd.read_sql('SELECT login FROM participants', api_data_saver.engine)['login'].values
-        
-        # basicInfo = await api.get_participant_credentials_by_login(login)
-        # df = pd.DataFrame(basicInfo).T.reset_index().rename(columns={'index':'login'})
-        # df.drop(columns=['schoolId'], inplace=True)
-        # api_data_saver._upsert(df, Table('participants', api_data_saver.meta, autoload_with=api_data_saver.engine))
-        
-        # data = await api.get_participant_projects_by_login('batwomal')
-        # with open('projects.json', 'r') as f:
-        #     data = json.load(f)
-        # data = pd.DataFrame(data['projects'])
-        # data = pd.DataFrame(data['courseId'].drop_duplicates().fillna(0).astype('int'), columns=['courseId'])
-        # data.sort_values(by=['courseId'], inplace=True)
-        # data.reset_index(drop=True, inplace=True)
-        # data.drop(0, inplace=True)
-
-        
-        
-        # api_data_saver._upsert(
-        #     data,
-        #     Table('courses', api_data_saver.meta, autoload_with=api_data_saver.engine)
-        # )
-        # data = []
-        # data.append( await api.get_project_by_project_id(21389))
-        # print(pd.DataFrame(data))
-
-        # projects = pd.read_sql('SELECT id FROM projects', api_data_saver.engine)
-        # projects = [int(i) for i in projects['id'].values]
-        ProjectDatabase.cleanup(api_data_saver.engine)
-        with open ('projects.json') as f:
-            projects = json.load(f)
-
-        projects = [project['id'] for project in projects['projects']]
-        # print(projects)
-        data = await api.getProjectInfo(projects[:])
-
-        for i , project in enumerate(data.values()):
-            print(i)    
-            create_from_json(api_data_saver.engine, project['data'])
-
-
-        # data = await api.getProjectInfo([51501, 69052, 40658, 51504])
-        # with open('projectInfo1.json', 'w') as f:
-        #     json.dump(data, f, indent=4, ensure_ascii=False)
+        pipeline = build_pipeline(api, api_data_saver)
+        # pipeline.reset('projects')
+        await pipeline.run()
+
+        # Ежедневное обновление: сначала дешёвый сигнал активности, затем остальное
+        # await api_data_saver.refresh_incremental(api, 'basic', max_age=timedelta(days=1))
+        # for endpoint in ('points', 'feedback', 'credentials'):
+        #     await api_data_saver.refresh_incremental(api, endpoint, max_age=timedelta(days=7))
 
     except Exception as e:
         print(e)
@@ -0,0 +1,156 @@
+import inspect
+import traceback
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+from sqlalchemy import Table, Column, MetaData, String, DateTime, PrimaryKeyConstraint, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine.base import Engine
+
+checkpoint_meta = MetaData()
+
+crawlCheckpoints = Table(
+    'crawlCheckpoints',
+    checkpoint_meta,
+    Column('stage', String, nullable=False),
+    Column('item', String, nullable=False),
+    Column('completedAt', DateTime, nullable=False),
+    PrimaryKeyConstraint('stage', 'item'),
+)
+
+
+class Stage:
+    """
+    Шаг обхода API.
+
+    :param name: Уникальное имя шага (ключ чекпоинтов).
+    :param items: Функция, возвращающая элементы шага; вызывается после завершения зависимостей,
+        поэтому может читать из базы то, что сохранили предыдущие шаги.
+    :param process: Обработчик пачки элементов (sync или async). Должен выбрасывать исключение при ошибке:
+        пачка помечается выполненной только после успешного возврата. Если обработчик возвращает
+        список элементов, выполненными помечаются только они (None — вся пачка).
+    :param depends_on: Имена шагов, которые должны завершиться раньше.
+    :param batch_size: Размер пачки, после которой сохраняется чекпоинт.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        items: Callable[[], Iterable[Any]],
+        process: Callable[[List[Any]], Any],
+        depends_on: Iterable[str] = (),
+        batch_size: int = 100,
+    ):
+        self.name = name
+        self.items = items
+        self.process = process
+        self.depends_on = list(depends_on)
+        self.batch_size = batch_size
+
+    def __repr__(self):
+        return f"Stage(name={self.name}, depends_on={self.depends_on})"
+
+
+class Pipeline:
+    """
+    Запускает шаги в порядке зависимостей (DAG) и хранит поэлементные чекпоинты
+    в таблице crawlCheckpoints. Повторный запуск после падения пропускает уже
+    обработанные элементы, поэтому ручные OFFSET и срезы не нужны.
+    """
+
+    def __init__(self, engine: Engine, stages: Iterable[Stage]):
+        self.engine = engine
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Шаг {stage.name} объявлен дважды")
+            self.stages[stage.name] = stage
+        checkpoint_meta.create_all(self.engine)
+
+    def order(self) -> List[Stage]:
+        """Топологическая сортировка шагов."""
+        for stage in self.stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Шаг {stage.name} зависит от неизвестного шага {dependency}")
+
+        ordered, visiting, visited = [], set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Цикл в зависимостях шагов через {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            ordered.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name)
+        return ordered
+
+    def completed(self, stage: str) -> set:
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(crawlCheckpoints.c.item).where(crawlCheckpoints.c.stage == stage)
+            )
+            return {row.item for row in rows}
+
+    def mark_completed(self, stage: str, items: List[Any]):
+        if not items:
+            return
+        now = datetime.now()
+        stmt = insert(crawlCheckpoints).values(
+            [{'stage': stage, 'item': str(item), 'completedAt': now} for item in items]
+        ).on_conflict_do_nothing()
+        with self.engine.begin() as connection:
+            connection.execute(stmt)
+
+    def reset(self, stage: Optional[str] = None):
+        """Удаляет чекпоинты шага (или всех шагов), чтобы пройти его заново."""
+        stmt = crawlCheckpoints.delete()
+        if stage is not None:
+            stmt = stmt.where(crawlCheckpoints.c.stage == stage)
+        with self.engine.begin() as connection:
+            connection.execute(stmt)
+
+    async def run_stage(self, stage: Stage):
+        done = self.completed(stage.name)
+        items = list(stage.items())
+        pending = [item for item in items if str(item) not in done]
+        print(f'{stage.name}: {len(items) - len(pending)}/{len(items)} already done')
+
+        for start in range(0, len(pending), stage.batch_size):
+            batch = pending[start:start + stage.batch_size]
+            result = stage.process(batch)
+            if inspect.isawaitable(result):
+                result = await result
+            if result is None:
+                completed = batch
+            else:
+                # Сравнение по строке: так элементы хранятся в чекпоинтах
+                succeeded = {str(item) for item in result}
+                completed = [item for item in batch if str(item) in succeeded]
+                if len(completed) < len(batch):
+                    print(f'{stage.name}: {len(batch) - len(completed)} items not saved, will retry on next run')
+            self.mark_completed(stage.name, completed)
+            print(f'{stage.name}: {len(items) - len(pending) + start + len(batch)}/{len(items)}')
+
+    async def run(self, only: Optional[Iterable[str]] = None):
+        """
+        Выполняет все шаги (или только перечисленные в only).
+        При ошибке останавливается; уже сохранённые чекпоинты остаются.
+        """
+        only = set(only) if only is not None else None
+        for stage in self.order():
+            if only is not None and stage.name not in only:
+                continue
+            try:
+                await self.run_stage(stage)
+            except Exception as e:
+                print(f'Stage {stage.name} failed: {e}')
+                traceback.print_exc()
+                raise
@@ -0,0 +1,212 @@
+import glob
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from graphql import build_schema, parse, validate, print_ast, visit, Visitor
+    from graphql.language import (
+        DocumentNode, FieldNode, NameNode, OperationDefinitionNode, SelectionSetNode, VariableNode,
+    )
+except ImportError:  # Валидация по схеме и batch-запросы необязательны
+    build_schema = None
+
+logger = logging.getLogger("School21API")
+
+# Предупреждение об отключённых batch-запросах выводится один раз на процесс
+_batching_warned = False
+
+OPERATION_TYPE = re.compile(r"^\s*(query|mutation|subscription)\b", re.MULTILINE)
+
+
+class BatchedOperation(NamedTuple):
+    """
+    Несколько копий одной операции в одном документе: переменные получают
+    суффикс _<i>, корневые поля — алиас b<i>_<имя поля>.
+    """
+    name: str
+    document: str
+    root_keys: Tuple[str, ...]
+    count: int
+
+    @staticmethod
+    def alias(index: int, key: str) -> str:
+        return f"b{index}_{key}"
+
+    def variables(self, variables_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            f"{name}_{index}": value
+            for index, variables in enumerate(variables_list)
+            for name, value in variables.items()
+        }
+
+    def split(self, response: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        Раскладывает ответ обратно на ответы отдельных операций (в формате одиночного запроса).
+        None — ответ нельзя разобрать (нет data или есть ошибки без пути).
+        """
+        if not isinstance(response, dict) or not isinstance(response.get('data'), dict):
+            return None
+        parts = [{'data': {}} for _ in range(self.count)]
+        for index, part in enumerate(parts):
+            for key in self.root_keys:
+                part['data'][key] = response['data'].get(self.alias(index, key))
+        prefixes = [self.alias(index, '') for index in range(self.count)]
+        for error in response.get('errors') or []:
+            path = error.get('path') or []
+            index = next(
+                (i for i, prefix in enumerate(prefixes) if path and str(path[0]).startswith(prefix)), None
+            )
+            if index is None:
+                return None
+            parts[index].setdefault('errors', []).append(error)
+        return parts
+
+
+class _SuffixVariables(Visitor if build_schema is not None else object):
+    def __init__(self, suffix: str):
+        super().__init__()
+        self.suffix = suffix
+
+    def enter_variable(self, node, *_):
+        return VariableNode(name=NameNode(value=node.name.value + self.suffix))
+
+
+class OperationRegistry:
+    """
+    Реестр GraphQL-операций из s21schema/schema/operations/*.gql.
+
+    Все документы читаются один раз при создании, по возможности проверяются
+    по схеме и хранятся в памяти вместе с sha256-хэшем для persisted queries.
+
+    :param operations_path: Каталог с файлами операций.
+    :param schema_path: Путь к схеме для валидации (если установлен graphql-core).
+    """
+
+    def __init__(self, operations_path: str, schema_path: Optional[str] = None):
+        self.operations_path = operations_path
+        self.schema_path = schema_path
+        self.documents: Dict[str, str] = {}
+        self.hashes: Dict[str, str] = {}
+        self.types: Dict[str, str] = {}
+        self._batched: Dict[Tuple[str, int], Optional[BatchedOperation]] = {}
+        self.load()
+
+    def load(self):
+        for path in sorted(glob.glob(os.path.join(self.operations_path, "*.gql"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(path, "r") as f:
+                document = f.read()
+            match = OPERATION_TYPE.search(document)
+            self.documents[name] = document
+            self.hashes[name] = hashlib.sha256(document.encode()).hexdigest()
+            self.types[name] = match.group(1) if match else "query"
+        self.validate()
+
+    def validate(self):
+        """Проверяет все операции по схеме и выбрасывает ValueError при ошибках."""
+        if build_schema is None or not self.schema_path or not os.path.exists(self.schema_path):
+            logger.info("GraphQL-операции загружены без валидации по схеме")
+            return
+        with open(self.schema_path, "r") as f:
+            schema = build_schema(f.read())
+        invalid = {}
+        for name, document in self.documents.items():
+            errors = validate(schema, parse(document))
+            if errors:
+                invalid[name] = [error.message for error in errors]
+        if invalid:
+            raise ValueError(f"Некорректные GraphQL-операции: {invalid}")
+
+    def get(self, operation_name: str) -> str:
+        try:
+            return self.documents[operation_name]
+        except KeyError:
+            raise KeyError(
+                f"Операция {operation_name} не найдена в {self.operations_path}"
+            ) from None
+
+    def register(self, operation_name: str, document: str):
+        """Добавляет операцию, собранную в коде (например, QueryBuilder.build)."""
+        match = OPERATION_TYPE.search(document)
+        self.documents[operation_name] = document
+        self.hashes[operation_name] = hashlib.sha256(document.encode()).hexdigest()
+        self.types[operation_name] = match.group(1) if match else "query"
+        self._batched = {key: value for key, value in self._batched.items() if key[0] != operation_name}
+
+    def batched(self, operation_name: str, count: int) -> Optional[BatchedOperation]:
+        """
+        Документ с count копиями операции через алиасы (строится один раз на размер пачки).
+        None — если graphql-core не установлен или операцию нельзя объединить.
+        """
+        if build_schema is None:
+            global _batching_warned
+            if not _batching_warned:
+                logger.warning("event=batching_disabled reason=graphql-core not installed")
+                _batching_warned = True
+            return None
+        key = (operation_name, count)
+        if key not in self._batched:
+            self._batched[key] = self._build_batched(operation_name, count)
+        return self._batched[key]
+
+    def _build_batched(self, operation_name: str, count: int) -> Optional[BatchedOperation]:
+        document = parse(self.get(operation_name))
+        operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+        if len(operations) != 1:
+            return None
+        operation = operations[0]
+        if not all(isinstance(selection, FieldNode) for selection in operation.selection_set.selections):
+            return None
+        fragments = [d for d in document.definitions if d is not operation]
+        # Переменные внутри фрагментов нельзя переименовать для каждой копии отдельно
+        if any('$' in print_ast(fragment) for fragment in fragments):
+            return None
+
+        root_keys = tuple(
+            (field.alias or field.name).value for field in operation.selection_set.selections
+        )
+        variable_definitions, selections = [], []
+        for index in range(count):
+            renamed = visit(operation, _SuffixVariables(f"_{index}"))
+            variable_definitions.extend(renamed.variable_definitions or ())
+            for field in renamed.selection_set.selections:
+                selections.append(FieldNode(
+                    alias=NameNode(value=BatchedOperation.alias(index, (field.alias or field.name).value)),
+                    name=field.name,
+                    arguments=field.arguments,
+                    directives=field.directives,
+                    selection_set=field.selection_set,
+                ))
+
+        name = f"{operation_name}Batch{count}"
+        batched = OperationDefinitionNode(
+            operation=operation.operation,
+            name=NameNode(value=name),
+            variable_definitions=tuple(variable_definitions),
+            directives=operation.directives,
+            selection_set=SelectionSetNode(selections=tuple(selections)),
+        )
+        return BatchedOperation(
+            name=name,
+            document=print_ast(DocumentNode(definitions=(batched, *fragments))),
+            root_keys=root_keys,
+            count=count,
+        )
+
+    def persisted_query(self, operation_name: str) -> Dict[str, Dict]:
+        """Блок extensions для отправки хэша вместо текста запроса (APQ)."""
+        return {
+            "persistedQuery": {
+                "version": 1,
+                "sha256Hash": self.hashes[operation_name],
+            }
+        }
+
+    def __contains__(self, operation_name: str) -> bool:
+        return operation_name in self.documents
+
+    def __len__(self) -> int:
+        return len(self.documents)
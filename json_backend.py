@@ -0,0 +1,83 @@
+"""
+Единый JSON-бэкенд для клиента и дампов: orjson или msgspec, если установлены,
+иначе стандартный json. Вывод по умолчанию компактный (без отступов), в UTF-8.
+
+Бэкенд можно выбрать переменной окружения S21_JSON_BACKEND или set_backend().
+"""
+
+import json
+import os
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec необязателен
+    msgspec = None
+
+BACKENDS = [name for name, module in (('orjson', orjson), ('msgspec', msgspec)) if module is not None] + ['json']
+
+BACKEND = None
+DecodeError = (ValueError,)
+
+
+def set_backend(name: str):
+    """Переключает бэкенд: orjson, msgspec или json."""
+    global BACKEND, DecodeError
+    if name not in BACKENDS:
+        raise ValueError(f"JSON-бэкенд {name} недоступен, доступны: {BACKENDS}")
+    BACKEND = name
+    DecodeError = (ValueError, msgspec.DecodeError) if name == 'msgspec' else (ValueError,)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    if BACKEND == 'msgspec':
+        return _msgspec_decoder.decode(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Сериализует obj в UTF-8 байты; неизвестные типы (Decimal, datetime и т.п.) — через str."""
+    if BACKEND == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=option)
+    if BACKEND == 'msgspec':
+        encoder = _msgspec_sorted_encoder if sort_keys else _msgspec_encoder
+        data = encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+        sort_keys=sort_keys,
+        default=str,
+    ).encode()
+
+
+def load(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump(obj: Any, path: str, indent: bool = False, sort_keys: bool = False):
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent=indent, sort_keys=sort_keys))
+
+
+if msgspec is not None:
+    _msgspec_decoder = msgspec.json.Decoder()
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=str)
+    _msgspec_sorted_encoder = msgspec.json.Encoder(enc_hook=str, order='sorted')
+
+set_backend(os.environ.get('S21_JSON_BACKEND', BACKENDS[0]))
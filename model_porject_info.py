@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum, ARRAY, Table
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum, ARRAY, Table, text, create_engine
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import relationship, declarative_base, Session, backref
 from sqlalchemy.engine.base import Engine
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Iterable, Optional, Callable, Tuple
 import enum
 import json
+import weakref
 
 Base = declarative_base()
 
@@ -82,6 +89,9 @@ class ProjectTimelineItem(Base):
     end = Column(DateTime)
     order = Column(Integer)
     parentId = Column(Integer, ForeignKey('projectTimelineItem.id'))
+    # Материализованный путь '/<id корня>/.../<id>/' — поддерево выбирается по LIKE без рекурсивного CTE
+    path = Column(String, index=True)
+    depth = Column(Integer)
     children = relationship(
         'ProjectTimelineItem',
         backref=backref('parent', remote_side=[id]),
@@ -275,13 +285,156 @@ class StudentAnswer(Base):
     id = Column(Integer, primary_key=True)
 
 
+# Bulk Ingestion Helpers ----------------------------------------------------
+class IdAllocator:
+    """
+    Выдаёт id на стороне клиента, забирая значения из SERIAL-последовательностей блоками,
+    чтобы связи между строками можно было проставить до вставки, без flush.
+
+    Первый блок для таблицы маленький, каждый следующий вдвое больше (не больше
+    block_size): одиночный проект не сжигает тысячи значений последовательности,
+    а на больших пачках число запросов nextval остаётся логарифмическим.
+
+    id из API и id из последовательности живут в одном пространстве, поэтому
+    аллокатор помнит, какие id выдал сам (такие строки вставляются без upsert),
+    и после записи строк с id из API сдвигает последовательность за их максимум.
+    """
+
+    def __init__(self, session: Session, block_size: int = 1000, initial_block_size: int = 8):
+        self.session = session
+        self.block_size = block_size
+        self.initial_block_size = min(initial_block_size, block_size)
+        self._pool: Dict[str, List[int]] = {}
+        self._issued: Dict[str, int] = {}
+        self._sequences: Dict[str, str] = {}
+        self._generated: Dict[str, set] = {}
+        self._api_ids: Dict[str, set] = {}
+
+    def next(self, table: Table) -> int:
+        pool = self._pool.setdefault(table.name, [])
+        api_ids = self._api_ids.get(table.name, ())
+        while True:
+            if not pool:
+                issued = self._issued.get(table.name, 0)
+                count = min(self.block_size, max(self.initial_block_size, issued))
+                pool.extend(reversed(self._fetch(table, count)))
+                self._issued[table.name] = issued + count
+            value = pool.pop()
+            # Значение из блока, взятого до записи строк с id из API, может с ними совпасть
+            if value not in api_ids:
+                self._generated.setdefault(table.name, set()).add(value)
+                return value
+
+    def get(self, table: Table, data: Optional[dict]) -> int:
+        """id из ответа API, если он есть, иначе следующий из последовательности."""
+        api_id = (data or {}).get('id')
+        if api_id is None:
+            return self.next(table)
+        self._api_ids.setdefault(table.name, set()).add(api_id)
+        return api_id
+
+    def generated(self, table: Table, value: int) -> bool:
+        """Выдан ли id из последовательности (а не пришёл из API)."""
+        return value in self._generated.get(table.name, ())
+
+    def advance(self, table: Table, max_id: int):
+        """Сдвигает последовательность за max_id, чтобы следующие nextval не совпали с id из API."""
+        self.session.execute(
+            text(
+                "SELECT setval(CAST(:sequence AS regclass), :max_id) "
+                "WHERE :max_id > COALESCE(pg_sequence_last_value(CAST(:sequence AS regclass)), 0)"
+            ),
+            {'sequence': self._sequence(table), 'max_id': max_id}
+        )
+
+    def _sequence(self, table: Table) -> str:
+        sequence = self._sequences.get(table.name)
+        if sequence is None:
+            sequence = self.session.execute(
+                text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                {'table': f'"{table.name}"'}
+            ).scalar()
+            self._sequences[table.name] = sequence
+        return sequence
+
+    def _fetch(self, table: Table, count: int) -> List[int]:
+        return list(self.session.execute(
+            text("SELECT nextval(:sequence) FROM generate_series(1, :count)"),
+            {'sequence': self._sequence(table), 'count': count}
+        ).scalars())
+
+
+def flatten_timeline(forest: Iterable[dict], next_id: Callable[[dict], int]) -> Tuple[List[dict], List[int]]:
+    """
+    Обходит лес timeline в ширину и превращает его в плоский список строк
+    ProjectTimelineItem с заранее выданными id, parentId и материализованным путём.
+    Родители всегда идут раньше детей, поэтому список вставляется одним пакетом.
+
+    :param next_id: Выдаёт id для элемента по его данным (id из API или из последовательности).
+    :return: (строки, id корневых элементов)
+    """
+    rows, root_ids = [], []
+    queue = deque((item, None) for item in forest or [])
+    while queue:
+        timeline_data, parent = queue.popleft()
+        item_id = next_id(timeline_data)
+        # Все строки с одинаковым набором колонок (недостающие — None): _insert_rows
+        # группирует строки по колонкам, и только так сохраняется порядок «родитель раньше ребёнка»
+        row = dict.fromkeys(ProjectTimelineItem.__table__.columns.keys())
+        row.update(_row(
+            ProjectTimelineItem,
+            {k: v for k, v in timeline_data.items() if k not in ('id', 'children')},
+            id=item_id,
+            parentId=parent['id'] if parent else None,
+            path=f"{parent['path'] if parent else '/'}{item_id}/",
+            depth=parent['depth'] + 1 if parent else 0,
+        ))
+        rows.append(row)
+        if parent is None:
+            root_ids.append(item_id)
+        queue.extend((child, row) for child in timeline_data.get('children', []) or [])
+    return rows, root_ids
+
+
+def _row(model, data: Optional[dict], **extra) -> dict:
+    """Строка для вставки: только колонки модели, extra перекрывает данные."""
+    columns = model.__table__.columns
+    row = {k: v for k, v in (data or {}).items() if k in columns}
+    row.update(extra)
+    return row
+
+
+# Таблицы, id которых приходят из API, а не из последовательностей
+_API_ID_TABLES = frozenset(model.__table__ for model in (
+    Task, StudyModule, StudentModule, ModuleCoverInformation, SoftSkill, ProjectTimelineItem,
+))
+
+
 # Database Manager Class ----------------------------------------------------
 class ProjectDatabase:
-    def __init__(self, engine: Engine):
+    # Движки, для которых схема уже создана в этом процессе
+    _schema_ready = weakref.WeakSet()
+
+    def __init__(self, engine: Engine, create_schema: bool = True):
         self.engine = engine
-        Base.metadata.create_all(self.engine)
+        if create_schema and engine not in self._schema_ready:
+            self.setup_schema(engine)
         self.session = Session(self.engine)
 
+    @classmethod
+    def setup_schema(cls, engine: Engine):
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            # create_all не добавляет колонки в уже существующую таблицу
+            connection.execute(text(
+                'ALTER TABLE "projectTimelineItem" '
+                'ADD COLUMN IF NOT EXISTS path VARCHAR, ADD COLUMN IF NOT EXISTS depth INTEGER'
+            ))
+            connection.execute(text(
+                'CREATE INDEX IF NOT EXISTS "ix_projectTimelineItem_path" ON "projectTimelineItem" (path)'
+            ))
+        cls._schema_ready.add(engine)
+
     def save_project_info(self, project_data: dict):
         try:
             student_data = project_data.get('student', {})
@@ -354,20 +507,12 @@ class ProjectDatabase:
             # Сохранение ModuleCoverInformation
             cover_data = student_data.get('getModuleCoverInformation', {})
             if cover_data:
-                def save_timeline(timeline_data, parent_id=None):
-                    timeline = ProjectTimelineItem(
-                        parentId=parent_id,
-                        **{k: v for k, v in timeline_data.items() if k != 'children' and v is not None}
-                    )
-                    self.session.add(timeline)
-                    self.session.flush()
-                    for child in timeline_data.get('children', []) or []:  # Обрабатываем как null, так и пустой список
-                        save_timeline(child, timeline.id)
-                    return timeline.id
-
-                # Обрабатываем каждый элемент списка timeline
-                timeline_data = cover_data.get('timeline', [])
-                timeline_ids = [save_timeline(item) for item in timeline_data]
+                # Всё дерево timeline вставляется одним пакетом с заранее выданными id
+                ids = IdAllocator(self.session)
+                timeline_rows, timeline_ids = flatten_timeline(
+                    cover_data.get('timeline', []), lambda data: ids.get(ProjectTimelineItem.__table__, data)
+                )
+                self._insert_rows({ProjectTimelineItem.__table__: timeline_rows}, ids)
                 
                 # Сохраняем ModuleCoverInformation
                 for timeline_id in timeline_ids:
@@ -425,16 +570,352 @@ class ProjectDatabase:
             traceback.print_exc()
             raise RuntimeError(f"Ошибка сохранения данных: {str(e)}")
     
+    def _project_rows(self, project_data: dict, ids: IdAllocator, rows: Dict[Table, List[dict]]):
+        """
+        Раскладывает один ответ getProjectInfo по строкам таблиц. id из API сохраняются
+        (строки с ними вставляются как upsert), остальные выдаются из последовательностей.
+        """
+        def add(model, row: dict) -> dict:
+            rows.setdefault(model.__table__, []).append(row)
+            return row
+
+        student_data = project_data.get('student', {}) or {}
+
+        # StudentModule и связанные данные
+        module_data = student_data.get('getModuleById', {})
+        if module_data:
+            study_module_data = module_data.get('studyModule', {}) or {}
+            retry_settings = add(ModuleAttemptsSettings, _row(
+                ModuleAttemptsSettings, study_module_data.get('retrySettings'),
+                id=ids.next(ModuleAttemptsSettings.__table__),
+            ))
+            study_module = add(StudyModule, _row(
+                StudyModule,
+                {k: v for k, v in study_module_data.items() if k not in ('id', 'levels', 'retrySettings')},
+                id=ids.get(StudyModule.__table__, study_module_data), retrySettingsId=retry_settings['id'],
+            ))
+
+            for level_data in study_module_data.get('levels', []) or []:
+                level = add(Level, {'id': ids.next(Level.__table__), 'studyModuleId': study_module['id']})
+                for goal_element_data in level_data.get('goalElements', []) or []:
+                    for task_data in goal_element_data.get('tasks', []) or []:
+                        # id задач приходят из API и могут повторяться между проектами
+                        add(Task, {'id': task_data.get('id')})
+                        rows.setdefault(levelTaskAssociation, []).append(
+                            {'levelId': level['id'], 'taskId': task_data.get('id')}
+                        )
+
+            team_settings = add(TeamSettings, _row(
+                TeamSettings, module_data.get('teamSettings'), id=ids.next(TeamSettings.__table__),
+            ))
+            student_module = add(StudentModule, _row(
+                StudentModule,
+                {k: v for k, v in module_data.items()
+                 if k not in ['id', 'studyModule', 'currentTask', 'teamSettings', 'courseBaseParameters']},
+                id=ids.get(StudentModule.__table__, module_data),
+                studyModuleId=study_module['id'],
+                teamSettingsId=team_settings['id'],
+            ))
+            add(CourseBaseParameters, _row(
+                CourseBaseParameters, module_data.get('courseBaseParameters'),
+                id=ids.next(CourseBaseParameters.__table__), studentModuleId=student_module['id'],
+            ))
+
+        # ModuleCoverInformation и дерево timeline
+        cover_data = student_data.get('getModuleCoverInformation', {})
+        if cover_data:
+            timeline_rows, timeline_ids = flatten_timeline(
+                cover_data.get('timeline', []), lambda data: ids.get(ProjectTimelineItem.__table__, data)
+            )
+            rows.setdefault(ProjectTimelineItem.__table__, []).extend(timeline_rows)
+            cover_fields = {k: v for k, v in cover_data.items() if k not in ('id', 'softSkills', 'timeline')}
+            cover = None
+            for timeline_id in timeline_ids or [None]:
+                cover = add(ModuleCoverInformation, _row(
+                    ModuleCoverInformation, cover_fields,
+                    id=ids.get(ModuleCoverInformation.__table__, cover_data), timelineId=timeline_id,
+                ))
+            for skill_data in cover_data.get('softSkills', []) or []:
+                add(SoftSkill, _row(
+                    SoftSkill, {k: v for k, v in skill_data.items() if k != 'id'},
+                    id=ids.get(SoftSkill.__table__, skill_data), moduleCoverId=cover['id'],
+                ))
+
+        # P2PChecksInfo
+        p2p_data = student_data.get('getP2PChecksInfo', {})
+        if p2p_data:
+            reviews_info = add(ProjectReviewsInfo, _row(
+                ProjectReviewsInfo, p2p_data.get('projectReviewsInfo'),
+                id=ids.next(ProjectReviewsInfo.__table__),
+            ))
+            add(P2PChecksInfo, _row(
+                P2PChecksInfo, {k: v for k, v in p2p_data.items() if k not in ('id', 'projectReviewsInfo')},
+                id=ids.next(P2PChecksInfo.__table__), projectReviewsInfoId=reviews_info['id'],
+            ))
+
+        # StudentCodeReviewsWithCountRound
+        code_reviews_data = student_data.get('getStudentCodeReviewByGoalId', {})
+        if code_reviews_data:
+            code_reviews_info = add(CodeReviewsInfo, _row(
+                CodeReviewsInfo, code_reviews_data.get('codeReviewsInfo'),
+                id=ids.next(CodeReviewsInfo.__table__),
+            ))
+            add(StudentCodeReviewsWithCountRound, _row(
+                StudentCodeReviewsWithCountRound,
+                {k: v for k, v in code_reviews_data.items() if k not in ('id', 'codeReviewsInfo')},
+                id=ids.next(StudentCodeReviewsWithCountRound.__table__),
+                codeReviewsInfoId=code_reviews_info['id'],
+            ))
+
+    def _insert_rows(self, rows: Dict[Table, List[dict]], ids: IdAllocator):
+        """
+        Вставляет подготовленные строки: по одному executemany на таблицу и набор колонок.
+
+        В таблицах из _API_ID_TABLES upsert делается только для строк с id из API;
+        строки с id из последовательности вставляются обычным INSERT, чтобы совпадение
+        id было ошибкой, а не тихой перезаписью чужой строки.
+        """
+        for table in Base.metadata.sorted_tables:
+            table_rows = rows.get(table)
+            if not table_rows:
+                continue
+            if table in _API_ID_TABLES:
+                api_rows = [row for row in table_rows if not ids.generated(table, row['id'])]
+                # Строка с одним id вставляется один раз (ON CONFLICT не может
+                # затронуть одну строку дважды в одной команде), побеждает последняя
+                api_rows = list({row['id']: row for row in api_rows}.values())
+                # Порядок по id одинаков во всех сессиях, поэтому параллельные воркеры
+                # берут блокировки общих строк в одном порядке и не ловят deadlock;
+                # timeline сортируется по глубине, чтобы родители шли раньше детей
+                table_rows = sorted(
+                    api_rows + [row for row in table_rows if ids.generated(table, row['id'])],
+                    key=(lambda row: (row['depth'], row['id'])) if table is ProjectTimelineItem.__table__
+                    else (lambda row: row['id']),
+                )
+            # Группа — набор колонок, происхождение id и (для timeline) глубина:
+            # уровни дерева идут по порядку, поэтому родитель вставлен раньше ребёнка
+            groups: Dict[tuple, List[dict]] = {}
+            for row in table_rows:
+                generated = table in _API_ID_TABLES and ids.generated(table, row['id'])
+                depth = row.get('depth') if table is ProjectTimelineItem.__table__ else None
+                groups.setdefault((depth, generated, tuple(sorted(row))), []).append(row)
+            for (_, generated, columns), group in groups.items():
+                stmt = insert(table)
+                if table is Task.__table__:
+                    # Задачи общие для проектов и могут уже существовать
+                    stmt = stmt.on_conflict_do_nothing()
+                elif table in _API_ID_TABLES and not generated:
+                    # id из API: повторная загрузка того же проекта обновляет строку
+                    update = {column: stmt.excluded[column] for column in columns if column != 'id'}
+                    stmt = (stmt.on_conflict_do_update(index_elements=['id'], set_=update)
+                            if update else stmt.on_conflict_do_nothing())
+                self.session.execute(stmt, group)
+            if table in _API_ID_TABLES:
+                api_ids = [
+                    row['id'] for row in table_rows
+                    if row['id'] is not None and not ids.generated(table, row['id'])
+                ]
+                if api_ids:
+                    ids.advance(table, max(api_ids))
+
+    def ingest_many(self, projects: Iterable[dict], commit_every: int = 100, id_block_size: int = 1000) -> Dict[str, Any]:
+        """
+        Пакетная загрузка ответов getProjectInfo в одной сессии с коммитом каждые commit_every проектов.
+
+        Ошибка в отдельном проекте не откатывает остальные: пачка пишется в точке
+        сохранения, а при ошибке проекты из неё повторяются по одному.
+
+        :return: {'saved': число сохранённых проектов, 'failed': {номер проекта: текст ошибки}}
+        """
+        ids = IdAllocator(self.session, id_block_size)
+        report = {'saved': 0, 'failed': {}}
+        chunk = []
+        for index, project_data in enumerate(projects):
+            chunk.append((index, project_data))
+            if len(chunk) >= commit_every:
+                self._ingest_chunk(chunk, ids, report)
+                chunk = []
+        if chunk:
+            self._ingest_chunk(chunk, ids, report)
+        if report['failed']:
+            print(f"Не удалось сохранить {len(report['failed'])} проектов: {report['failed']}")
+        return report
+
+    def _ingest_chunk(self, chunk: List[tuple], ids: IdAllocator, report: Dict[str, Any]):
+        prepared = []
+        for index, project_data in chunk:
+            rows: Dict[Table, List[dict]] = {}
+            try:
+                self._project_rows(project_data, ids, rows)
+            except Exception as e:
+                report['failed'][index] = str(e)
+                continue
+            prepared.append((index, rows))
+
+        merged: Dict[Table, List[dict]] = {}
+        for _, rows in prepared:
+            for table, table_rows in rows.items():
+                merged.setdefault(table, []).extend(table_rows)
+
+        saved = []
+        try:
+            with self.session.begin_nested():
+                self._insert_rows(merged, ids)
+            saved = [index for index, _ in prepared]
+        except Exception:
+            # Ищем проблемные проекты, сохраняя остальные по одному
+            for index, rows in prepared:
+                try:
+                    with self.session.begin_nested():
+                        self._insert_rows(rows, ids)
+                    saved.append(index)
+                except Exception as e:
+                    report['failed'][index] = str(e)
+
+        try:
+            self.session.commit()
+            report['saved'] += len(saved)
+        except Exception as e:
+            self.session.rollback()
+            for index in saved:
+                report['failed'][index] = str(e)
+
+    def timeline_subtree(self, item_id: int) -> List[ProjectTimelineItem]:
+        """Элемент timeline и все его потомки (по материализованному пути)."""
+        root = self.session.get(ProjectTimelineItem, item_id)
+        if root is None or root.path is None:
+            return []
+        return (
+            self.session.query(ProjectTimelineItem)
+            .filter(ProjectTimelineItem.path.like(f"{root.path}%"))
+            .order_by(ProjectTimelineItem.depth, ProjectTimelineItem.order)
+            .all()
+        )
+
     def cleanup(self):
         Base.metadata.drop_all(self.engine)
+        # Следующий ProjectDatabase на этом engine должен создать схему заново
+        self._schema_ready.discard(self.engine)
 
     def close(self):
         self.session.close()
 
 # Helper Functions ----------------------------------------------------------
+def create_pooled_engine(
+    url: str,
+    pool_size: int = 10,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    pool_recycle: int = 1800,
+    pool_pre_ping: bool = True,
+    statement_timeout_ms: Optional[int] = None,
+    prepare_threshold: Optional[int] = None,
+    application_name: str = 'school21-crawler',
+    **kwargs,
+):
+    """
+    Engine с настроенным пулом соединений для ApiDataSaver и ProjectDatabase.
+
+    :param pool_size: Постоянное количество соединений в пуле.
+    :param max_overflow: Сколько соединений можно открыть сверх pool_size под нагрузкой.
+    :param pool_recycle: Через сколько секунд пересоздавать соединение.
+    :param pool_pre_ping: Проверять соединение перед выдачей из пула (мёртвые заменяются).
+    :param statement_timeout_ms: statement_timeout на стороне сервера.
+    :param prepare_threshold: После скольких выполнений запрос готовится на сервере.
+        Поддерживается драйвером psycopg 3 (postgresql+psycopg://); psycopg2 его игнорирует.
+    """
+    options = []
+    if statement_timeout_ms:
+        options.append(f'-c statement_timeout={statement_timeout_ms}')
+    connect_args = {'application_name': application_name}
+    if options:
+        connect_args['options'] = ' '.join(options)
+    if prepare_threshold is not None and url.startswith('postgresql+psycopg:'):
+        connect_args['prepare_threshold'] = prepare_threshold
+    connect_args.update(kwargs.pop('connect_args', {}))
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        connect_args=connect_args,
+        **kwargs,
+    )
+
+
 def create_from_json(engine: Engine, json: dict):
     db = ProjectDatabase(engine)
     try:
-        db.save_project_info(json)
+        report = db.ingest_many([json])
+        if report['failed']:
+            raise RuntimeError(f"Ошибка сохранения данных: {report['failed'][0]}")
+    finally:
+        db.close()
+
+
+def create_many_from_json(engine: Engine, projects: Iterable[dict], commit_every: int = 100) -> Dict[str, Any]:
+    db = ProjectDatabase(engine)
+    try:
+        return db.ingest_many(projects, commit_every=commit_every)
+    finally:
+        db.close()
+
+
+def _ingest_worker(url: str, shard: List[tuple], commit_every: int, engine_options: Dict[str, Any]) -> Dict[str, Any]:
+    """Процесс-воркер: свой engine и своя сессия, номера проектов возвращаются глобальные."""
+    # Воркеру хватает одного соединения; остальные настройки — как у родительского engine
+    engine = create_pooled_engine(url, **{**engine_options, 'pool_size': 1, 'max_overflow': 0})
+    try:
+        # Схему уже создал родительский процесс
+        db = ProjectDatabase(engine, create_schema=False)
+        try:
+            report = db.ingest_many([project_data for _, project_data in shard], commit_every=commit_every)
+        finally:
+            db.close()
     finally:
-        db.close()
\ No newline at end of file
+        engine.dispose()
+    return {
+        'saved': report['saved'],
+        'failed': {shard[index][0]: error for index, error in report['failed'].items()},
+    }
+
+
+def ingest_parallel(engine: Engine, projects: Iterable[dict], workers: Optional[int] = None,
+                    commit_every: int = 100, engine_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Загружает ответы getProjectInfo в несколько процессов, по шарду на процесс.
+
+    Схема создаётся один раз в родительском процессе. id выдаются блоками из
+    общих последовательностей (nextval не пересекается между сессиями), поэтому
+    диапазоны id разных воркеров не конфликтуют и все связи проставляются
+    внутри воркера; общие строки с id из API вставляются через ON CONFLICT
+    в порядке id, поэтому воркеры не блокируют друг друга взаимно.
+
+    Воркеры запускаются через spawn: функция может вызываться из потока
+    (asyncio.to_thread), а fork из многопоточного процесса небезопасен.
+
+    :param engine_options: Параметры create_pooled_engine для engine воркеров.
+    """
+    projects = list(projects)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(projects)))
+    if workers == 1:
+        return create_many_from_json(engine, projects, commit_every=commit_every)
+
+    ProjectDatabase.setup_schema(engine)
+    url = engine.url.render_as_string(hide_password=False)
+    shards = [list(enumerate(projects))[worker::workers] for worker in range(workers)]
+
+    report = {'saved': 0, 'failed': {}}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(_ingest_worker, url, shard, commit_every, engine_options or {})
+            for shard in shards
+        ]
+        for future in futures:
+            shard_report = future.result()
+            report['saved'] += shard_report['saved']
+            report['failed'].update(shard_report['failed'])
+    return report
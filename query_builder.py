@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, List, Optional
+
+from graphql import GraphQLSchema, build_schema, get_named_type, is_leaf_type, is_non_null_type
+from graphql.type import GraphQLInterfaceType, GraphQLObjectType
+
+
+class QueryBuilder:
+    """
+    Строит GraphQL-запросы с минимальным набором полей по схеме
+    (например, Convertor.schema), чтобы не скачивать и не разбирать
+    данные, которые потом выбрасываются.
+
+    builder = QueryBuilder(Convertor('s21schema/schema/schema.gql').schema)
+    builder.build(
+        'getProjectAttemptEvaluationsInfoByStudent',
+        root='school21.getProjectAttemptEvaluationsInfo',
+        fields=['studentAnswerId', 'auto.status', 'p2p.checklist.reviewer.login'],
+    )
+
+    Поля задаются путями через точку относительно последнего поля root.
+    Поле объектного типа без вложенных полей раскрывается в его скалярные поля.
+    Аргументы последнего поля root становятся переменными запроса.
+
+    :param schema: Разобранная GraphQL-схема.
+    """
+
+    def __init__(self, schema: GraphQLSchema):
+        if schema is None:
+            raise ValueError("Схема не загружена")
+        self.schema = schema
+
+    @classmethod
+    def from_file(cls, schema_path: str) -> "QueryBuilder":
+        with open(schema_path, "r") as f:
+            return cls(build_schema(f.read()))
+
+    def build(
+        self,
+        operation_name: str,
+        root: str,
+        fields: Iterable[str],
+        arguments: Optional[Iterable[str]] = None,
+        operation: str = "query",
+    ) -> str:
+        """
+        Текст операции с выборкой только перечисленных полей.
+
+        :param operation_name: Имя операции в документе.
+        :param root: Путь от корневого типа до поля, которое возвращает нужные данные.
+        :param fields: Нужные поля (пути через точку) внутри root.
+        :param arguments: Аргументы последнего поля root, передаваемые как переменные
+            (по умолчанию — все обязательные).
+        :param operation: query, mutation или subscription.
+        """
+        parent = getattr(self.schema, f"{operation}_type", None)
+        if parent is None:
+            raise ValueError(f"В схеме нет корневого типа для {operation}")
+
+        root_path = root.split(".")
+        for name in root_path[:-1]:
+            parent = get_named_type(self._field(parent, name, root).type)
+
+        leaf = self._field(parent, root_path[-1], root)
+        if arguments is None:
+            arguments = [name for name, arg in leaf.args.items() if is_non_null_type(arg.type)]
+        arguments = list(arguments)
+        for name in arguments:
+            if name not in leaf.args:
+                raise ValueError(f"У поля {root} нет аргумента {name}")
+
+        variables = ", ".join(f"${name}: {leaf.args[name].type}" for name in arguments)
+        call = ", ".join(f"{name}: ${name}" for name in arguments)
+        selection = self._selection(get_named_type(leaf.type), self._tree(fields), root)
+
+        # Вложенность корневых полей: school21 { getStudentByLogin(login: $login) { ... } }
+        body = f"{root_path[-1]}({call}) {selection}" if call else f"{root_path[-1]} {selection}"
+        for name in reversed(root_path[:-1]):
+            body = f"{name} {{ {body} }}"
+        header = f"{operation} {operation_name}({variables})" if variables else f"{operation} {operation_name}"
+        return f"{header} {{ {body} }}"
+
+    @staticmethod
+    def _tree(fields: Iterable[str]) -> Dict[str, dict]:
+        tree: Dict[str, dict] = {}
+        for path in fields:
+            node = tree
+            for name in path.split("."):
+                node = node.setdefault(name, {})
+        return tree
+
+    @staticmethod
+    def _field(parent, name: str, path: str):
+        if not isinstance(parent, (GraphQLObjectType, GraphQLInterfaceType)):
+            raise ValueError(f"{path}: у типа {parent} нет полей")
+        field = parent.fields.get(name)
+        if field is None:
+            raise ValueError(f"{path}: в типе {parent.name} нет поля {name}")
+        return field
+
+    def _selection(self, parent, tree: Dict[str, dict], path: str) -> str:
+        if not tree:
+            # Объект без явных полей — берём все его скалярные поля
+            if not isinstance(parent, (GraphQLObjectType, GraphQLInterfaceType)):
+                raise ValueError(f"{path}: для типа {parent} нужно перечислить поля")
+            names = [name for name, field in parent.fields.items()
+                     if is_leaf_type(get_named_type(field.type)) and not field.args]
+            return "{ " + " ".join(names) + " }"
+
+        parts: List[str] = []
+        for name, subtree in tree.items():
+            field_path = f"{path}.{name}"
+            field_type = get_named_type(self._field(parent, name, field_path).type)
+            if is_leaf_type(field_type):
+                if subtree:
+                    raise ValueError(f"{field_path}: скалярное поле не имеет вложенных полей")
+                parts.append(name)
+            else:
+                parts.append(f"{name} {self._selection(field_type, subtree, field_path)}")
+        return "{ " + " ".join(parts) + " }"
@@ -0,0 +1,115 @@
+import uuid
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from sqlalchemy import Table, Integer, Float, Boolean, String, Enum, JSON, Uuid
+
+import json_backend
+
+
+def _coercer(column_type) -> Optional[Callable[[Any], Any]]:
+    """Функция приведения значения к типу колонки (None — без приведения)."""
+    if isinstance(column_type, Boolean):
+        return bool
+    if isinstance(column_type, Integer):
+        return int
+    if isinstance(column_type, Float):
+        return float
+    if isinstance(column_type, Uuid):
+        return lambda value: value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    if isinstance(column_type, JSON):
+        return None
+    if isinstance(column_type, (Enum, String)):
+        return str
+    return None
+
+
+def _getter(path: Tuple[str, ...]) -> Callable[[Any], Any]:
+    """Значение по пути в dict или в модели из api_models (доступ через атрибуты)."""
+    if len(path) == 1:
+        key = path[0]
+        return lambda payload: payload.get(key) if isinstance(payload, dict) else getattr(payload, key, None)
+
+    def get(payload):
+        for key in path:
+            if payload is None:
+                return None
+            payload = payload.get(key) if isinstance(payload, dict) else getattr(payload, key, None)
+        return payload
+
+    return get
+
+
+class RecordNormalizer:
+    """
+    Преобразует JSON-ответы API прямо в кортежи для вставки в таблицу, без pandas.
+
+    План (колонки, пути в ответе и приведение типов) строится один раз по описанию
+    таблицы, после чего каждый ответ обрабатывается одним проходом.
+
+    normalizer = RecordNormalizer(participants, ['login', 'campusShortName'],
+                                  sources={'campusShortName': 'campus.shortName'})
+    normalizer(payload) -> ('login', '21 Moscow')
+
+    :param table: Целевая таблица.
+    :param columns: Проекция — какие колонки заполнять (по умолчанию все колонки таблицы).
+    :param sources: Путь к значению в ответе через точку, если он отличается от имени колонки.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        columns: Optional[List[str]] = None,
+        sources: Optional[Dict[str, str]] = None,
+    ):
+        self.table = table
+        self.columns = list(columns or [col.name for col in table.columns])
+        sources = sources or {}
+        unknown = [col for col in self.columns if col not in table.columns]
+        if unknown:
+            raise ValueError(f"В таблице {table.name} нет колонок {unknown}")
+        self._plan = [
+            (
+                index,
+                _getter(tuple(sources.get(col, col).split('.'))),
+                _coercer(table.columns[col].type),
+            )
+            for index, col in enumerate(self.columns)
+        ]
+
+    def __call__(self, payload: dict, **extra) -> tuple:
+        """
+        Кортеж значений в порядке self.columns.
+        Значения из extra (например, login=...) имеют приоритет над ответом.
+        """
+        row = [None] * len(self._plan)
+        for index, get, coerce in self._plan:
+            column = self.columns[index]
+            value = extra[column] if column in extra else get(payload)
+            if value is not None and coerce is not None:
+                value = coerce(value)
+            row[index] = value
+        return tuple(row)
+
+    def many(self, payloads, **extra) -> List[tuple]:
+        return [self(payload, **extra) for payload in payloads if payload]
+
+    @staticmethod
+    def csv_value(value) -> Any:
+        """Представление значения для COPY ... WITH (FORMAT csv)."""
+        if isinstance(value, (dict, list)):
+            return json_backend.dumps(value).decode()
+        return value
+
+    @staticmethod
+    def csv_line(row) -> str:
+        """
+        Строка для COPY ... WITH (FORMAT csv). COPY читает как NULL только пустое поле
+        без кавычек, поэтому None пишется пустым полем, а все остальные значения —
+        в кавычках: пустая строка остаётся пустой строкой, как и при обычном INSERT.
+        (csv.writer пишет '' и None одинаково, а QUOTE_NOTNULL есть только с Python 3.12.)
+        """
+        return ','.join(
+            '' if value is None else '"' + str(RecordNormalizer.csv_value(value)).replace('"', '""') + '"'
+            for value in row
+        ) + '\n'
+
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from typing import Optional, Dict, Any, NamedTuple
+
+import json_backend
+
+# Время жизни ответа (сек.) по шаблону эндпоинта или имени GraphQL-операции.
+# Первый совпавший шаблон побеждает.
+DEFAULT_TTL = {
+    r"v1/campuses$": 24 * 3600,
+    r"v1/campuses/[^/]+/coalitions": 24 * 3600,
+    r"v1/campuses/[^/]+/clusters": 24 * 3600,
+    r"v1/projects/\d+$": 24 * 3600,
+    r"v1/courses/\d+$": 24 * 3600,
+    r"v1/graph": 24 * 3600,
+    r"getProjectInfo": 24 * 3600,
+    r"/points$": 3600,
+    r"/feedback$": 3600,
+}
+
+
+class CacheEntry(NamedTuple):
+    data: Any
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """Заголовки для условного запроса."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Персистентный кэш ответов API в SQLite.
+
+    Ключ — sha256 от метода, URL, параметров и тела запроса (для GraphQL это
+    operationName, variables и хэш текста запроса). Устаревшие записи не удаляются
+    сразу: их ETag/Last-Modified используются для условного запроса, и на 304
+    запись просто продлевается. При превышении max_bytes вытесняются давно
+    не читавшиеся записи (LRU).
+
+    Время последнего чтения копится в памяти и пишется в базу пачками по
+    access_batch записей (а также перед вытеснением и при закрытии), чтобы
+    попадание в кэш не стоило коммита.
+
+    :param path: Путь к файлу базы.
+    :param ttl: Шаблоны эндпоинтов и время жизни в секундах.
+    :param default_ttl: Время жизни для остальных эндпоинтов.
+    :param max_bytes: Максимальный суммарный размер тел ответов.
+    :param access_batch: Сколько чтений накапливать перед записью accessed_at.
+    """
+
+    def __init__(
+        self,
+        path: str = "api_cache.sqlite",
+        ttl: Optional[Dict[str, int]] = None,
+        default_ttl: int = 3600,
+        max_bytes: int = 512 * 1024 * 1024,
+        access_batch: int = 256,
+    ):
+        self.ttl = [(re.compile(pattern), seconds) for pattern, seconds in (ttl or DEFAULT_TTL).items()]
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.access_batch = access_batch
+        self._accessed: Dict[str, float] = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+        # Суммарный размер считается один раз и дальше ведётся при записи и удалении
+        (self.total_bytes,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    @staticmethod
+    def cacheable(method: str, json_data: Optional[Dict[str, Any]] = None) -> bool:
+        """Кэшируются GET-запросы и GraphQL-запросы, кроме мутаций."""
+        if method.upper() == "GET":
+            return True
+        if method.upper() == "POST" and json_data and "query" in json_data:
+            return not json_data["query"].lstrip().startswith("mutation")
+        return False
+
+    @staticmethod
+    def key(
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json_data: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        if json_data and "query" in json_data:
+            # Вместо полного текста запроса — его хэш: изменённая или заново
+            # зарегистрированная операция с тем же именем получает новый ключ
+            query = json_data["query"]
+            json_data = {k: v for k, v in json_data.items() if k != "query"}
+            json_data["queryHash"] = hashlib.sha256(query.encode()).hexdigest()
+        raw = json.dumps(
+            [method.upper(), url, params or {}, json_data or {}],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def ttl_for(self, url: str, json_data: Optional[Dict[str, Any]] = None) -> int:
+        target = url
+        if json_data and json_data.get("operationName"):
+            target = f"{url} {json_data['operationName']}"
+        for pattern, seconds in self.ttl:
+            if pattern.search(target):
+                return seconds
+        return self.default_ttl
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        row = self.conn.execute(
+            "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        self._accessed[key] = now
+        if len(self._accessed) >= self.access_batch:
+            self.flush_access()
+        body, etag, last_modified, expires_at = row
+        return CacheEntry(json_backend.loads(body), etag, last_modified, now < expires_at)
+
+    def flush_access(self):
+        """Записывает накопленное время последнего чтения одним коммитом."""
+        if not self._accessed:
+            return
+        self.conn.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+        )
+        self.conn.commit()
+        self._accessed.clear()
+
+    def set(
+        self,
+        key: str,
+        url: str,
+        data: Any,
+        ttl: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        body = json_backend.dumps(data)
+        now = time.time()
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO responses
+                (key, url, body, size, etag, last_modified, stored_at, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (key, url, body, len(body), etag, last_modified, now, now + ttl, now),
+        )
+        self.conn.commit()
+        self._accessed.pop(key, None)
+        self.total_bytes += len(body) - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def refresh(self, key: str, ttl: int):
+        """Продлевает запись после ответа 304 Not Modified."""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+            (now + ttl, now, key),
+        )
+        self.conn.commit()
+        self._accessed.pop(key, None)
+
+    def evict(self):
+        """Удаляет давно не читавшиеся записи, пока размер не уложится в max_bytes."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        # LRU должен видеть недавние чтения
+        self.flush_access()
+        excess = self.total_bytes - self.max_bytes
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC")
+        victims = []
+        for key, size in rows:
+            victims.append((key,))
+            excess -= size
+            self.total_bytes -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM responses")
+        self.conn.commit()
+        self._accessed.clear()
+        self.total_bytes = 0
+
+    def close(self):
+        self.flush_access()
+        self.conn.close()
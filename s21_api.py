@@ -1,56 +1,159 @@
 import aiohttp
 import asyncio
+import atexit
+import itertools
+import queue
+import random
 import requests
 import logging
 import json
+from logging.handlers import QueueHandler, QueueListener
+from collections import deque
 from typing import Optional, Dict, Any, List, Callable
 from functools import wraps
+from urllib.parse import urlparse
 import time
 from getpass import getpass
 
-# Настройка логгера
+from response_cache import ResponseCache
+import api_models
+import json_backend
+from gql_operations import OperationRegistry
+from api_metrics import MetricsRegistry, endpoint_label
+
+# Настройка логгера: запись в файл идёт в отдельном потоке через очередь,
+# поэтому файловый ввод-вывод не блокирует event loop
+class _LazyQueueHandler(QueueHandler):
+    """Не форматирует запись в потоке event loop — это делает QueueListener."""
+
+    def prepare(self, record):
+        return record
+
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler("api.log"),  # Запись в файл
+    # logging.StreamHandler(),  # Вывод в консоль
+)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("api.log"),  # Запись в файл
-        # logging.StreamHandler(),  # Вывод в консоль
-    ],
+    handlers=[_LazyQueueHandler(_log_queue)],
 )
+for _handler in _log_listener.handlers:
+    _handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger("School21API")
 
+# Доля логируемых успешных вызовов по имени метода; ошибки логируются всегда.
+# Семплируются транспорт и обёртки, которые вызываются на каждый логин, проект или страницу
+LOG_SAMPLE_RATES: Dict[str, float] = {
+    '_make_request': 0.01,
+    '_gql_request': 0.01,
+    'get_participant_by_login': 0.01,
+    'get_points_by_login': 0.01,
+    'get_participant_feedback_by_login': 0.01,
+    'get_participant_workstation_by_login': 0.01,
+    'get_soft_skill_by_login': 0.01,
+    'get_participant_projects_by_login': 0.01,
+    'get_participant_project_by_login_and_project_id': 0.01,
+    'get_log_weekly_avg_hours_by_login_and_date': 0.01,
+    'get_xp_history_by_login': 0.01,
+    'get_participant_courses_by_login': 0.01,
+    'get_participant_course_by_login_and_course_id': 0.01,
+    'get_coalition_by_login': 0.01,
+    'get_badges_by_login': 0.01,
+    'get_project_by_project_id': 0.01,
+    'get_participants_by_campus_id': 0.01,
+}
+
+def _summarize(value, depth: int = 0) -> str:
+    """Краткое описание значения: тип и размеры вместо полного содержимого."""
+    if isinstance(value, (list, tuple, set)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, dict):
+        if depth:
+            return f"dict[{len(value)}]"
+        items = ", ".join(f"{k}: {_summarize(v, depth + 1)}" for k, v in itertools.islice(value.items(), 5))
+        return "{" + items + (", ..." if len(value) > 5 else "") + "}"
+    text = repr(value)
+    return text if len(text) <= 80 else f"{text[:77]}..."
+
+def _summarize_args(args, kwargs) -> str:
+    parts = [_summarize(arg) for arg in args]
+    parts += [f"{k}={_summarize(v)}" for k, v in kwargs.items()]
+    return "(" + ", ".join(parts) + ")"
+
 def log_request_response(func):
     """
     Декоратор для логирования запросов и ответов.
+    Пишет одну структурированную запись key=value на вызов с размерами
+    аргументов и результата вместо их содержимого. Успешные вызовы
+    логируются с вероятностью из LOG_SAMPLE_RATES.
     """
+    name = func.__name__
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        # Логируем начало вызова метода
-        logger.info(f"Вызов метода: {func.__name__}")
-        logger.info(f"Аргументы: args={args}, kwargs={kwargs}")
-
+        started = time.monotonic()
         try:
             # Выполняем метод
             result = await func(*args, **kwargs)
-            # Логируем успешный результат
-            logger.info(f"Метод {func.__name__} завершён успешно. Результат: {result}")
-            return result
         except Exception as e:
             # Логируем ошибку
-            logger.error(f"Ошибка в методе {func.__name__}: {e}", exc_info=True)
+            logger.error(
+                "event=error method=%s args=%s error=%r",
+                name, _summarize_args(args[1:], kwargs), e, exc_info=True,
+            )
             raise  # Пробрасываем исключение дальше
+        # Логируем успешный результат
+        if logger.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLE_RATES.get(name, 1.0):
+            logger.info(
+                "event=call method=%s args=%s result=%s elapsed_ms=%.1f",
+                name, _summarize_args(args[1:], kwargs), _summarize(result),
+                (time.monotonic() - started) * 1000,
+            )
+        return result
 
     return wrapper
 
-def paginated_request(page_size: int = 1000, concurrency_limit: int = 10):
+def _page_items(result):
+    """
+    Возвращает список элементов страницы.
+    Если ответ — словарь, берётся первое значение-список.
+    """
+    if isinstance(result, dict):
+        for value in result.values():
+            if isinstance(value, (list, tuple)):
+                return value
+    return result if result is not None else []
+
+def _page_total(result) -> Optional[int]:
+    """
+    Возвращает общее количество элементов, если эндпоинт его сообщает.
+    Общий ключ count не учитывается: им часто называют размер текущей страницы.
+    """
+    if isinstance(result, dict):
+        for key in ("total", "totalCount", "totalElements"):
+            if isinstance(result.get(key), int):
+                return result[key]
+    return None
+
+def paginated_request(page_size: int = 1000, concurrency_limit: Optional[int] = None):
     """
     Декоратор для выполнения постраничных запросов и объединения результатов.
-    Продолжает выполнять запросы, пока длина ответа не станет нулевой.
     Подстраивается под любую структуру ответа.
 
+    Сначала запрашивается первая страница. Если ответ содержит общее количество
+    элементов, оставшиеся страницы запрашиваются параллельно ровно по нему.
+    Иначе конец выборки ищется дешёвыми запросами с limit=1 (экспоненциальный,
+    затем бинарный поиск первой пустой страницы), после чего параллельно
+    запрашиваются только непустые страницы — без холостых полных запросов.
+
     :param page_size: Количество элементов на одной странице.
     :param concurrency_limit: Максимальное количество одновременных запросов.
+        По умолчанию (None) ограничение задаёт общий AdaptiveRateLimiter клиента.
     """
 
     def decorator(func: Callable):
@@ -60,69 +163,134 @@ def paginated_request(page_size: int = 1000, concurrency_limit: int = 10):
             limit = kwargs.pop("limit", page_size)
             offset = kwargs.pop("offset", 0)
 
-            # Список для хранения всех результатов
-            all_results = []
-
-            # Семафор для ограничения количества одновременных запросов
-            semaphore = asyncio.Semaphore(concurrency_limit)
+            # Семафор нужен только при явном локальном ограничении
+            semaphore = asyncio.Semaphore(concurrency_limit) if concurrency_limit else None
 
-            async def fetch_page(current_offset: int):
+            async def fetch_page(page: int, page_limit: int = limit):
+                if semaphore is None:
+                    return await func(*args, **kwargs, limit=page_limit, offset=offset + page * limit)
                 async with semaphore:  # Ограничиваем количество одновременных запросов
-                    result = await func(*args, **kwargs, limit=limit, offset=current_offset)
-                    return result
+                    return await func(*args, **kwargs, limit=page_limit, offset=offset + page * limit)
+
+            async def page_exists(page: int) -> bool:
+                return bool(len(_page_items(await fetch_page(page, 1))))
+
+            first = await fetch_page(0)
+            if first is None:
+                # Повторы исчерпаны: None, чтобы вызывающий отличил сбой от пустой выборки
+                return None
+            first_count = len(_page_items(first))
+            if not first_count:
+                return []
+
+            total = _page_total(first)
+            if total is not None and total <= offset + first_count:
+                # Не больше уже полученного: либо выборка кончилась на первой странице,
+                # либо это размер страницы, а не общее количество — конец ищем сами
+                total = None
+            if total is not None:
+                pages = max(1, -(-(total - offset) // limit))
+            elif first_count < limit:
+                pages = 1
+            else:
+                # Экспоненциальный поиск: находим непустую low и пустую high страницы
+                low, high = 0, 1
+                while await page_exists(high):
+                    low, high = high, high * 2
+                # Бинарный поиск первой пустой страницы
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if await page_exists(middle):
+                        low = middle
+                    else:
+                        high = middle
+                pages = high
 
-            while True:
-                # Создаем задачи для текущего блока запросов
-                tasks = [fetch_page(offset + i * page_size) for i in range(concurrency_limit)]
-                results = await asyncio.gather(*tasks)
-
-                # Проверяем, есть ли пустые ответы в текущем блоке
-                empty_responses_detected = False
-                for result in results:
-                    response_data = result
-                    if isinstance(result, dict):
-                        # Если ответ — это словарь, ищем ключ, который содержит список
+            results = [first] + list(await asyncio.gather(
+                *[fetch_page(page) for page in range(1, pages)]
+            ))
+
+            # Объединяем страницы в один результат
+            all_results = []
+            for result in results:
+                response_data = _page_items(result)
+                if not len(response_data):
+                    continue
+                if isinstance(result, dict):
+                    if not all_results:
+                        all_results = result.copy()
+                        for key, value in all_results.items():
+                            if isinstance(value, (list, tuple)):
+                                all_results[key] = list(value)
+                    else:
                         for key, value in result.items():
                             if isinstance(value, (list, tuple)):
-                                response_data = value
-                                break
+                                all_results[key].extend(value)
+                else:
+                    all_results.extend(response_data)
 
-                    # Если ответ пустой, отмечаем это и прерываем цикл
-                    if not len(response_data):
-                        empty_responses_detected = True
-                        break
+            # Возвращаем объединённый результат
+            return all_results
 
-                    # Добавляем результаты в общий список
-                    if isinstance(result, dict):
-                        if not all_results:
-                            all_results = result.copy()
-                        else:
-                            for key, value in result.items():
-                                if isinstance(value, (list, tuple)):
-                                    all_results[key].extend(value)
-                    else:
-                        all_results.extend(response_data)
+        return wrapper
 
-                # Если обнаружен пустой ответ, завершаем цикл
-                if empty_responses_detected:
-                    break
+    return decorator
 
-                # Увеличиваем offset для следующего блока запросов
-                offset += concurrency_limit * page_size
+def paginated_iter(page_size: int = 1000, prefetch: int = 2):
+    """
+    Декоратор, превращающий постраничный запрос в асинхронный генератор страниц.
+    Каждая страница отдаётся сразу после получения, при этом заранее запрашивается
+    не более prefetch следующих страниц, так что в памяти одновременно лежит
+    лишь несколько страниц. Генерация останавливается на пустой или неполной странице.
 
-            # Возвращаем объединённый результат
-            return all_results
+    :param page_size: Количество элементов на одной странице.
+    :param prefetch: Количество страниц, запрашиваемых наперёд.
+    """
+
+    def decorator(func: Callable):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Убираем limit и offset из kwargs, так как они будут управляться декоратором
+            limit = kwargs.pop("limit", page_size)
+            next_offset = kwargs.pop("offset", 0)
+            pending = deque()
+
+            def schedule():
+                nonlocal next_offset
+                pending.append(asyncio.ensure_future(
+                    func(*args, **kwargs, limit=limit, offset=next_offset)
+                ))
+                next_offset += limit
+
+            try:
+                for _ in range(prefetch + 1):
+                    schedule()
+                while pending:
+                    result = await pending.popleft()
+                    items = _page_items(result)
+                    if not len(items):
+                        break
+                    if len(items) < limit:
+                        yield result
+                        break
+                    schedule()
+                    yield result
+            finally:
+                # Отменяем лишние запросы, если потребитель остановился раньше
+                for task in pending:
+                    task.cancel()
 
         return wrapper
 
     return decorator
 
-def batch_async_requests(concurrency_limit: int = 10):
+def batch_async_requests(concurrency_limit: Optional[int] = None):
     """
     Декоратор для выполнения асинхронных запросов с поддержкой семафора.
     Принимает массив переменных, создаёт задачи для асинхронных запросов и объединяет результаты в один словарь.
 
     :param concurrency_limit: Максимальное количество одновременных запросов.
+        По умолчанию (None) ограничение задаёт общий AdaptiveRateLimiter клиента.
     """
 
     def decorator(func: Callable):
@@ -131,15 +299,17 @@ def batch_async_requests(concurrency_limit: int = 10):
             # Словарь для хранения всех результатов
             all_results = {}
 
-            # Семафор для ограничения количества одновременных запросов
-            semaphore = asyncio.Semaphore(concurrency_limit)
+            # Семафор нужен только при явном локальном ограничении
+            semaphore = asyncio.Semaphore(concurrency_limit) if concurrency_limit else None
 
             async def fetch_item(item: Any):
+                if semaphore is None:
+                    return {item : await func(self, item, *args, **kwargs)}
                 async with semaphore:  # Ограничиваем количество одновременных запросов
                     return {item : await func(self, item, *args, **kwargs)}
 
-            # Создаем задачи для каждого элемента
-            tasks = [fetch_item(item) for item in items]
+            # Создаем задачи для каждого уникального элемента
+            tasks = [fetch_item(item) for item in dict.fromkeys(items)]
             results = await asyncio.gather(*tasks)
 
             # Объединяем результаты в один словарь
@@ -154,6 +324,147 @@ def batch_async_requests(concurrency_limit: int = 10):
 
     return decorator
 
+class AdaptiveRateLimiter:
+    """
+    Ограничитель запросов к одному хосту: token bucket + AIMD-регулирование параллельности.
+
+    Пока ответы быстрые и успешные (2xx/304), скорость и число одновременных запросов
+    растут аддитивно (примерно на increase за «окно» запросов). На 429, 5xx, сетевых
+    ошибках и всплесках задержки оба параметра уменьшаются мультипликативно,
+    не чаще одного раза за cooldown.
+
+    :param rate: Начальное количество запросов в секунду.
+    :param burst: Ёмкость корзины токенов.
+    :param concurrency: Начальное количество одновременных запросов.
+    :param increase: Аддитивный прирост за окно успешных запросов.
+    :param decrease: Мультипликативный коэффициент снижения.
+    :param latency_threshold: Задержка (сек.), после которой ответ считается всплеском.
+    :param cooldown: Минимальный интервал (сек.) между снижениями.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        min_rate: float = 1.0,
+        max_rate: float = 200.0,
+        concurrency: float = 10,
+        min_concurrency: int = 1,
+        max_concurrency: int = 200,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_threshold: float = 5.0,
+        cooldown: float = 1.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.failures = 0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        # Очередь ожидающих слот (FIFO): освобождение слота будит ровно одного ожидающего
+        self._waiters: deque = deque()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """Ожидает свободный слот параллельности и токен скорости."""
+        if not self._waiters and self.in_flight < int(self.concurrency):
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter  # Слот передаётся в _wake вместе с in_flight += 1
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # Слот уже выдан, но задачу отменили — возвращаем его
+                    self._release_slot()
+                raise
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _wake(self):
+        """Отдаёт свободные слоты ожидающим по очереди (отменённые пропускаются)."""
+        while self._waiters and self.in_flight < int(self.concurrency):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake()
+
+    async def release(self, status: Optional[int], latency: float):
+        """
+        Освобождает слот и подстраивает скорость по результату запроса.
+
+        :param status: HTTP-статус ответа или None при сетевой ошибке.
+        :param latency: Время выполнения запроса в секундах.
+        """
+        if status is not None and 200 <= status < 400 and latency < self.latency_threshold:
+            self.successes += 1
+            self.concurrency = min(self.max_concurrency, self.concurrency + self.increase / self.concurrency)
+            self.rate = min(self.max_rate, self.rate + self.increase / max(self.concurrency, 1))
+        elif status == 429 or status is None or status >= 500 or latency >= self.latency_threshold:
+            if status == 429:
+                self.throttled += 1
+            else:
+                self.failures += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease)
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+        # Слот освобождается после пересчёта concurrency: при её росте просыпается больше ожидающих
+        self._release_slot()
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов (например, по заголовку Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Текущее состояние ограничителя."""
+        return {
+            'rate': round(self.rate, 2),
+            'concurrency': int(self.concurrency),
+            'in_flight': self.in_flight,
+            'successes': self.successes,
+            'throttled': self.throttled,
+            'failures': self.failures,
+        }
+
 class School21API:
     def __init__(
         self,
@@ -163,11 +474,21 @@ class School21API:
             'graphql' : 'https://edu.21-school.ru/services/graphql'
         },
         base_gql_schemas: str = "s21schema/schema/operations/",
+        gql_schema: str = "s21schema/schema/schema.gql",
+        persisted_queries: bool = False,
         api_key: str = "",
+        limiter_options: Optional[Dict[str, Any]] = None,
+        cache: Optional[ResponseCache] = None,
+        gql_batch_size: int = 50,
     ):
         self.auth_url = auth_url
         self.base_url = base_url
         self.base_gql_schemas = base_gql_schemas
+        # Все GraphQL-операции читаются и проверяются один раз
+        self.operations = OperationRegistry(base_gql_schemas, gql_schema)
+        self.persisted_queries = persisted_queries
+        # Сколько одинаковых операций объединять в один GraphQL-документ (1 — без объединения)
+        self.gql_batch_size = gql_batch_size
         self.api_key = self._get_token()
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -177,6 +498,16 @@ class School21API:
             'x-edu-product-id': '96098f4b-5708-4c42-a62c-6893419169b3',
         }
         self.session = None  # Сессия будет создана при первом запросе
+        # Общие для всех методов ограничители запросов, по одному на хост
+        self.limiter_options = limiter_options or {}
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}
+        # Персистентный кэш ответов; None — кэширование выключено
+        self.cache = cache
+        # Выполняющиеся запросы для объединения одинаковых вызовов (single-flight)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Счётчики и гистограммы задержек по эндпоинтам
+        self.metrics = MetricsRegistry()
+        self.metrics.register_gauge('limiters', self.limiter_metrics)
 
     def _get_token(self):
         try:
@@ -215,6 +546,16 @@ class School21API:
                 connector=aiohttp.TCPConnector(ssl=ssl_context)
             )
 
+    def _get_limiter(self, url: str) -> AdaptiveRateLimiter:
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveRateLimiter(**self.limiter_options)
+        return self.limiters[host]
+
+    def limiter_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Текущая скорость и число запросов в полёте по каждому хосту."""
+        return {host: limiter.metrics() for host, limiter in self.limiters.items()}
+
     @log_request_response
     async def _make_request(
         self,
@@ -224,61 +565,234 @@ class School21API:
         json: Optional[Dict[str, Any]] = None,
         params: Optional[Dict[str, Any]] = None,
         max_retries: int = 1000,
+        persisted: bool = False,
+        model: Optional[type] = None,
+        cache: bool = True,
     ):
         """
         Выполняет HTTP-запрос с повторными попытками в случае ошибок.
+        Одинаковые читающие запросы, выполняющиеся одновременно, объединяются
+        в один: все вызывающие получают один и тот же результат.
+
+        :param model: Модель из api_models: ответ декодируется прямо в неё вместо dict.
+        :param cache: False — ответ не читается из кэша и не сохраняется в него
+            (например, batch-запрос, который кэшируется по частям).
         """
 
         await self._ensure_session()
         url = f"{self.base_url[url]}{'/' if url=='api' else ''}{endpoint}"
+        label = endpoint_label(endpoint, (json or {}).get('operationName'))
+
+        if not ResponseCache.cacheable(method, json):
+            return await self._send_request(
+                method, url, json, params, max_retries, persisted=persisted, label=label, model=model
+            )
+
+        key = ResponseCache.key(method, url, params, json)
+        # Один и тот же запрос с разными моделями выполняется отдельно
+        flight_key = f"{key}:{model.__name__}" if model is not None else key
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._send_request(
+                    method, url, json, params, max_retries, key if cache else None, persisted, label, model
+                )
+            )
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+        # shield: отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _send_request(
+        self,
+        method: str,
+        url: str,
+        json: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        max_retries: int = 1000,
+        cache_key: Optional[str] = None,
+        persisted: bool = False,
+        label: Optional[str] = None,
+        model: Optional[type] = None,
+    ):
+        label = label or url
+        # Свежий ответ из кэша отдаём без запроса, устаревший — перепроверяем условным запросом
+        cached, headers = None, None
+        if self.cache is None:
+            cache_key = None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if cached.fresh:
+                    return cached.data if model is None else api_models.convert(cached.data, model)
+                headers = cached.validators()
+
+        # Persisted query: сначала отправляем только хэш, полный текст — если сервер его не знает
+        body = json
+        if persisted and json and 'query' in json:
+            body = {k: v for k, v in json.items() if k != 'query'}
+
+        limiter = self._get_limiter(url)
         retries = 0
         sleep = 0.5
         while retries < max_retries:
+            await limiter.acquire()
+            started = time.monotonic()
+            status = None
+            size = 0
             try:
-                async with self.session.request(method, url, params=params, json=json) as response:
-                    logger.info(f"Request to {url} returned status {response.status}")
+                async with self.session.request(method, url, params=params, json=body, headers=headers) as response:
+                    status = response.status
+                    logger.debug("event=response url=%s status=%s", url, status)
+                    if response.status == 304 and cached is not None:  # Not Modified
+                        self.cache.refresh(cache_key, self.cache.ttl_for(url, json))
+                        return cached.data if model is None else api_models.convert(cached.data, model)
                     if response.status == 429:  # Too Many Requests
                         retry_after = int(response.headers.get("Retry-After", 1))
-                        await asyncio.sleep(retry_after)
+                        logger.info("event=throttled url=%s retry_after=%s", url, retry_after)
+                        # Пауза общая для всех запросов к хосту
+                        limiter.pause(retry_after)
+                        self.metrics.retry(label)
                         retries += 1
                         continue
                     response.raise_for_status()  # Проверка на другие ошибки
-                    data = await response.json()
+                    raw = await response.read()
+                    size = len(raw)
+                    if model is not None:
+                        # Прямо из байтов в модель, без промежуточных dict
+                        data = api_models.decode(raw, model)
+                    else:
+                        data = json_backend.loads(raw)
+                    if body is not json and self._persisted_query_not_found(data):
+                        body = json
+                        continue
+                    if cache_key is not None and not (isinstance(data, dict) and data.get('errors')):
+                        self.cache.set(
+                            cache_key, url, data if model is None else api_models.to_builtins(data),
+                            self.cache.ttl_for(url, json),
+                            etag=response.headers.get("ETag"),
+                            last_modified=response.headers.get("Last-Modified"),
+                        )
                     # if ('graphql' in url):
                     #     data = data['data']['school21']
                     #     data = data[list(data.keys())[0]]
                     return data
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            except api_models.ValidationError:
+                # Повтор не поможет: ответ не соответствует модели
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, *json_backend.DecodeError) as e:
+                self.metrics.retry(label)
                 retries += 1
                 # if retries >= max_retries:
                 #     raise Exception(f"Request failed after {max_retries} retries: {e}")
-                await asyncio.sleep(sleep)  # Ожидание перед повторной попыткой
-    
+            finally:
+                elapsed = time.monotonic() - started
+                self.metrics.observe(label, status, elapsed, size)
+                await limiter.release(status, elapsed)
+            await asyncio.sleep(sleep)  # Ожидание перед повторной попыткой
+
+    @staticmethod
+    def _persisted_query_not_found(data) -> bool:
+        if not isinstance(data, dict):
+            return False
+        return any(
+            error.get('message') == 'PersistedQueryNotFound'
+            or (error.get('extensions') or {}).get('code') == 'PERSISTED_QUERY_NOT_FOUND'
+            for error in data.get('errors') or []
+        )
+
     @log_request_response
     async def _gql_request(
         self,
         operation_name: str = '',
         variables: dict = {}
     ):
-        with open(f'{self.base_gql_schemas}{operation_name}.gql', 'r') as f:
-            query = f.read()
+        return await self._make_request(
+            "POST",url='graphql', json=self._gql_payload(operation_name, variables),
+            persisted=self.persisted_queries
+        )
+
+    def _gql_payload(self, operation_name: str, variables: dict) -> Dict[str, Any]:
+        """Тело одиночного GraphQL-запроса (по нему же строится ключ кэша)."""
         json_data = {
             'operationName': operation_name,
             'variables': variables,
-            'query': query
+            'query': self.operations.get(operation_name)
         }
-        return await self._make_request(
-            "POST",url='graphql', json=json_data
-        )
+        if self.persisted_queries:
+            json_data['extensions'] = self.operations.persisted_query(operation_name)
+        return json_data
+
+    async def _gql_batch_request(
+        self,
+        operation_name: str,
+        variables_by_key: Dict[Any, dict],
+    ) -> Dict[Any, Any]:
+        """
+        Выполняет одну операцию для многих наборов переменных, объединяя их
+        по gql_batch_size в один документ через алиасы полей.
+
+        Ответ раскладывается обратно по ключам в формате одиночного запроса.
+        Элементы с ошибками и пачки, которые не удалось разобрать, повторяются
+        одиночными запросами.
+
+        Кэшируются не пачки, а ответы по каждому ключу — под тем же ключом, что
+        у одиночного запроса: при другом составе пачки уже загруженные элементы
+        берутся из кэша, и в запрос идут только остальные.
+        """
+        url = self.base_url['graphql']
+        cache_keys: Dict[Any, str] = {}
+        results: Dict[Any, Any] = {}
+        if self.cache is not None:
+            for key, variables in variables_by_key.items():
+                cache_keys[key] = ResponseCache.key("POST", url, None, self._gql_payload(operation_name, variables))
+                cached = self.cache.get(cache_keys[key])
+                if cached is not None and cached.fresh:
+                    results[key] = cached.data
+        keys = [key for key in variables_by_key if key not in results]
+
+        async def single(key: Any):
+            return await self._gql_request(operation_name=operation_name, variables=variables_by_key[key])
+
+        async def fetch_batch(batch_keys: List[Any]) -> List[Any]:
+            batched = self.operations.batched(operation_name, len(batch_keys)) if len(batch_keys) > 1 else None
+            if batched is None:
+                return await asyncio.gather(*(single(key) for key in batch_keys))
+            json_data = {
+                'operationName': batched.name,
+                'variables': batched.variables([variables_by_key[key] for key in batch_keys]),
+                'query': batched.document,
+            }
+            parts = batched.split(await self._make_request("POST", url='graphql', json=json_data, cache=False))
+            if parts is None:
+                logger.info("event=batch_fallback operation=%s size=%s", operation_name, len(batch_keys))
+                return await asyncio.gather(*(single(key) for key in batch_keys))
+            retry = [index for index, part in enumerate(parts) if part.get('errors')]
+            if self.cache is not None:
+                # Одиночные повторы кэшируются сами, здесь — только удачные части пачки
+                ttl = self.cache.ttl_for(url, {'operationName': operation_name})
+                for index, part in enumerate(parts):
+                    if not part.get('errors'):
+                        self.cache.set(cache_keys[batch_keys[index]], url, part, ttl)
+            if retry:
+                for index, result in zip(retry, await asyncio.gather(*(single(batch_keys[i]) for i in retry))):
+                    parts[index] = result
+            return parts
+
+        batch_size = max(1, self.gql_batch_size)
+        batches = [keys[start:start + batch_size] for start in range(0, len(keys), batch_size)]
+        for batch, batch_results in zip(batches, await asyncio.gather(*(fetch_batch(batch) for batch in batches))):
+            results.update(zip(batch, batch_results))
+        return {key: results[key] for key in variables_by_key}
 
     @log_request_response
     async def get_sales(self):
         return await self._make_request("GET", "v1/sales")
 
-    @batch_async_requests(concurrency_limit=10)
+    @batch_async_requests()
     @log_request_response
-    async def get_project_by_project_id(self, project_id: int):
-        return await self._make_request("GET", f"v1/projects/{project_id}")
+    async def get_project_by_project_id(self, project_id: int, model: Optional[type] = None):
+        return await self._make_request("GET", f"v1/projects/{project_id}", model=model)
 
     @log_request_response
     async def get_logins_by_project_id(
@@ -298,10 +812,10 @@ class School21API:
             "GET", f"v1/projects/{project_id}/participants", params=params
         )
 
-    @batch_async_requests(concurrency_limit=10)
+    @batch_async_requests()
     @log_request_response
-    async def get_participant_by_login(self, login: str):
-        return await self._make_request("GET", f"v1/participants/{login}")
+    async def get_participant_by_login(self, login: str, model: Optional[type] = None):
+        return await self._make_request("GET", f"v1/participants/{login}", model=model)
 
     @log_request_response
     async def get_participant_workstation_by_login(self, login: str):
@@ -326,27 +840,30 @@ class School21API:
             "GET", f"v1/participants/{login}/projects", params=params
         )
 
-    @batch_async_requests(concurrency_limit=100)
     @log_request_response
     async def publicProfileGetCredentialsByLogin(
         self,
-        login: str
+        logins: List[str],
+        model: Optional[type] = None,
     ):
-        variables = {
-            'login': login
-        }
-        return await self._gql_request(operation_name='publicProfileGetCredentialsByLogin', variables=variables)
+        results = await self._gql_batch_request(
+            'publicProfileGetCredentialsByLogin', {login: {'login': login} for login in logins}
+        )
+        if model is not None:
+            results = {
+                login: api_models.convert(result, model) if result is not None else None
+                for login, result in results.items()
+            }
+        return results
 
-    @batch_async_requests(concurrency_limit=100)
     @log_request_response
     async def getProjectInfo(
         self,
-        goalId: int
+        goalIds: List[int]
     ):
-        variables = {
-            'goalId': goalId
-        }
-        return await self._gql_request(operation_name='getProjectInfo', variables=variables)
+        return await self._gql_batch_request(
+            'getProjectInfo', {goalId: {'goalId': goalId} for goalId in goalIds}
+        )
 
     @log_request_response
     async def get_participant_project_by_login_and_project_id(
@@ -356,10 +873,10 @@ class School21API:
             "GET", f"v1/participants/{login}/projects/{project_id}"
         )
 
-    @batch_async_requests(20)
+    @batch_async_requests()
     @log_request_response
-    async def get_points_by_login(self, login: str):
-        return await self._make_request("GET", f"v1/participants/{login}/points")
+    async def get_points_by_login(self, login: str, model: Optional[type] = None):
+        return await self._make_request("GET", f"v1/participants/{login}/points", model=model)
 
     @log_request_response
     async def get_log_weekly_avg_hours_by_login_and_date(
@@ -370,10 +887,10 @@ class School21API:
             "GET", f"v1/participants/{login}/logtime", params=params
         )
 
-    @batch_async_requests(10)
+    @batch_async_requests()
     @log_request_response
-    async def get_participant_feedback_by_login(self, login: str):
-        return await self._make_request("GET", f"v1/participants/{login}/feedback")
+    async def get_participant_feedback_by_login(self, login: str, model: Optional[type] = None):
+        return await self._make_request("GET", f"v1/participants/{login}/feedback", model=model)
 
     @log_request_response
     async def get_xp_history_by_login(
@@ -438,8 +955,7 @@ class School21API:
         return await self._make_request("GET", f"v1/courses/{course_id}")
 
 
-    @log_request_response
-    @batch_async_requests(concurrency_limit=10)
+    @batch_async_requests()
     @log_request_response
     @paginated_request(concurrency_limit=1)
     async def get_participants_by_coalition_id(
@@ -469,8 +985,8 @@ class School21API:
         )
 
     @log_request_response
-    async def get_campuses(self):
-        return await self._make_request("GET", "v1/campuses")
+    async def get_campuses(self, model: Optional[type] = None):
+        return await self._make_request("GET", "v1/campuses", model=model)
 
     @paginated_request()
     @log_request_response
@@ -482,6 +998,28 @@ class School21API:
             "GET", f"v1/campuses/{campus_id}/participants", params=params
         )
 
+    @paginated_iter()
+    async def iter_participants_by_campus_id(
+        self, campus_id: str, limit: int = 50, offset: int = 0
+    ):
+        """
+        Постранично отдаёт участников кампуса:
+        async for page in api.iter_participants_by_campus_id(campus_id): ...
+        """
+        params = {"limit": limit, "offset": offset}
+        return await self._make_request(
+            "GET", f"v1/campuses/{campus_id}/participants", params=params
+        )
+
+    @paginated_iter()
+    async def iter_participants_by_coalition_id(
+        self, coalition_id: int, limit: int = 50, offset: int = 0
+    ):
+        params = {"limit": limit, "offset": offset}
+        return await self._make_request(
+            "GET", f"v1/coalitions/{coalition_id}/participants", params=params
+        )
+
     @log_request_response
     @batch_async_requests()
     @paginated_request(concurrency_limit=1)
@@ -502,9 +1040,11 @@ class School21API:
         """Закрывает сессию."""
         if self.session and not self.session.closed:
             await self.session.close()
+        if self.cache is not None:
+            self.cache.close()
 
 async def main():
-    api = School21API()
+    api = School21API(cache=ResponseCache())
     try:
         pass
         # print(api.headers)
@@ -0,0 +1,196 @@
+"""
+Колоночные снимки результатов обхода (Parquet или Arrow IPC) вместо JSON-дампов.
+
+Каждый шаг обхода хранится в своём каталоге с разбиением по кампусу и дате:
+
+    snapshots/<stage>/campus=<кампус>/date=<YYYY-MM-DD>/part-<время>.parquet
+
+Чтение отбирает нужные разделы и колонки, не разбирая остальное; файлы
+Arrow IPC без сжатия читаются через memory map без копирования.
+
+store = SnapshotStore()
+store.write('coins', [{'login': 'peer', 'coalition': 'Alpacas', 'coins': 10}], campus='21 Moscow')
+store.read('coins', columns=['login', 'coins'], campus='21 Moscow').to_pylist()
+"""
+
+import os
+import time
+from datetime import date as Date
+from typing import Any, Dict, Iterable, List, Optional, Union
+from urllib.parse import quote, unquote
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow необязателен
+    pa = None
+
+import json_backend
+
+FORMATS = {'parquet': ('parquet', 'parquet'), 'arrow': ('ipc', 'arrow')}
+
+
+class SnapshotStore:
+    """
+    :param root: Каталог снимков.
+    :param format: parquet (сжатие zstd) или arrow (IPC без сжатия, для memory map).
+    """
+
+    def __init__(self, root: str = 'snapshots', format: str = 'parquet'):
+        if pa is None:
+            raise ImportError('Для снимков нужен pyarrow: pip install pyarrow')
+        if format not in FORMATS:
+            raise ValueError(f'Неизвестный формат {format}, доступны: {list(FORMATS)}')
+        self.root = root
+        self.format = format
+
+    @staticmethod
+    def available() -> bool:
+        return pa is not None
+
+    def _partition_dir(self, stage: str, campus: str, date: str) -> str:
+        return os.path.join(self.root, stage, f'campus={quote(campus, safe="")}', f'date={date}')
+
+    def write(
+        self,
+        stage: str,
+        records: List[Dict[str, Any]],
+        campus: str = 'all',
+        date: Union[str, Date, None] = None,
+    ) -> Optional[str]:
+        """
+        Сохраняет записи шага в раздел (campus, date) отдельным файлом.
+        Повторная запись в тот же день добавляет новый файл, не перезаписывая старые.
+
+        :return: Путь к файлу или None, если записей нет.
+        """
+        if not records:
+            return None
+        date = (date or Date.today())
+        date = date.isoformat() if isinstance(date, Date) else date
+        directory = self._partition_dir(stage, campus, date)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{time.time_ns()}.{FORMATS[self.format][1]}')
+
+        # from_pylist берёт схему из первой записи и теряет ключи, которых в ней нет:
+        # колонки собираются по объединению ключей всех записей
+        columns = dict.fromkeys(key for record in records for key in record)
+        table = pa.Table.from_pydict({key: [record.get(key) for record in records] for key in columns})
+        if self.format == 'parquet':
+            pq.write_table(table, path, compression='zstd')
+        else:
+            feather.write_feather(table, path, compression='uncompressed')
+        return path
+
+    def write_by_campus(
+        self,
+        stage: str,
+        records: Dict[str, List[Dict[str, Any]]],
+        date: Union[str, Date, None] = None,
+    ) -> List[str]:
+        """Сохраняет {кампус: записи} — по разделу на кампус."""
+        paths = [self.write(stage, rows, campus=campus, date=date) for campus, rows in records.items()]
+        return [path for path in paths if path]
+
+    def dataset(self, stage: str, memory_map: bool = True) -> 'ds.Dataset':
+        """Набор файлов шага с разделами campus и date (без чтения данных)."""
+        partition_schema = pa.schema([('campus', pa.string()), ('date', pa.string())])
+        options = dict(
+            format=FORMATS[self.format][0],
+            partitioning=ds.partitioning(partition_schema, flavor='hive'),
+            filesystem=pafs.LocalFileSystem(use_mmap=memory_map),
+        )
+        path = os.path.join(self.root, stage)
+        dataset = ds.dataset(path, **options)
+        # Файлы разных разделов могут отличаться набором колонок: схема собирается
+        # из метаданных всех файлов, а не берётся из первого
+        schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+        if len(schemas) > 1:
+            schema = pa.unify_schemas(schemas + [partition_schema], promote_options='permissive')
+            dataset = ds.dataset(path, schema=schema, **options)
+        return dataset
+
+    def read(
+        self,
+        stage: str,
+        columns: Optional[Iterable[str]] = None,
+        campus: Optional[str] = None,
+        date: Union[str, Date, None] = None,
+        memory_map: bool = True,
+    ) -> 'pa.Table':
+        """
+        Читает снимок шага: только перечисленные колонки и только нужные разделы.
+
+        :param columns: Проекция колонок (по умолчанию все, включая campus и date).
+        :param campus: Кампус (по умолчанию все).
+        :param date: Дата снимка (по умолчанию все даты).
+        """
+        condition = None
+        if campus is not None:
+            condition = ds.field('campus') == campus
+        if date is not None:
+            date = date.isoformat() if isinstance(date, Date) else date
+            by_date = ds.field('date') == date
+            condition = by_date if condition is None else condition & by_date
+        return self.dataset(stage, memory_map).to_table(
+            columns=list(columns) if columns is not None else None, filter=condition
+        )
+
+    def latest_date(self, stage: str, campus: Optional[str] = None) -> Optional[str]:
+        """Дата последнего снимка шага."""
+        dates = [
+            entry.split('=', 1)[1]
+            for campus_dir in self.partitions(stage, campus)
+            for entry in os.listdir(campus_dir) if entry.startswith('date=')
+        ]
+        return max(dates) if dates else None
+
+    def partitions(self, stage: str, campus: Optional[str] = None) -> List[str]:
+        stage_dir = os.path.join(self.root, stage)
+        if not os.path.isdir(stage_dir):
+            return []
+        return [
+            os.path.join(stage_dir, entry) for entry in sorted(os.listdir(stage_dir))
+            if entry.startswith('campus=')
+            and (campus is None or unquote(entry.split('=', 1)[1]) == campus)
+        ]
+
+    def import_json(self, stage: str, path: str, flatten, date: Union[str, Date, None] = None) -> List[str]:
+        """
+        Переносит старый JSON-дамп в снимок.
+
+        :param flatten: Функция, превращающая разобранный JSON в {кампус: записи}.
+        """
+        return self.write_by_campus(stage, flatten(json_backend.load(path)), date=date)
+
+
+# Преобразование JSON-дампов api.py в записи {кампус: [строки]} -----------------
+def flatten_participants_with_coalitions(data: Dict[str, Dict[str, List]]) -> Dict[str, List[Dict[str, Any]]]:
+    """all_participants_with_coalitions.json: {кампус: {коалиция: [логины]}}."""
+    return {
+        campus: [
+            {'login': login, 'coalition': coalition}
+            for coalition, logins in coalitions.items() for login in logins
+        ]
+        for campus, coalitions in data.items()
+    }
+
+
+def flatten_peers(data: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """peers.json: {кампус: {коалиция: {логин: данные} или [логины]}}."""
+    return {
+        campus: [
+            {'login': login, 'coalition': coalition,
+             **((peers[login] or {}) if isinstance(peers, dict) else {})}
+            for coalition, peers in coalitions.items() for login in peers
+        ]
+        for campus, coalitions in data.items()
+    }
+
+
+def flatten_coins(data: Dict[str, int], campus: str, coalition: str) -> Dict[str, List[Dict[str, Any]]]:
+    """coins_<коалиция>.json: {логин: коины}."""
+    return {campus: [{'login': login, 'coalition': coalition, 'coins': coins} for login, coins in data.items()]}